@@ -1,23 +1,40 @@
+import atexit
 import os
 import logging
-from flask import Flask, jsonify
+import logging.handlers
+import queue
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
 from sqlalchemy.orm import DeclarativeBase
+from werkzeug.exceptions import HTTPException
 from werkzeug.middleware.proxy_fix import ProxyFix
+from utils import fastjson
+from utils.fastjson import ORJSONProvider
+from utils.http import conditional_response, jresp, make_etag
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+# Request threads only enqueue records; a listener thread does the stream writes, so a
+# burst of upstream errors can't serialize workers on the log handler's lock
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, *logging.root.handlers, respect_handler_level=True)
+logging.root.handlers = [logging.handlers.QueueHandler(_log_queue)]
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# Keep loaded attributes after commit so to_dict() doesn't re-SELECT each row
+db = SQLAlchemy(model_class=Base, session_options={'expire_on_commit': False})
 
 # Create the app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "galaxy-of-consequence-secret-key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
@@ -29,10 +46,30 @@ jwt = JWTManager(app)
 # Database configuration
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///galaxy.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
+    # Recycling under the server's idle timeout makes the per-checkout ping optional
+    "pool_recycle": 1800,
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "0") == "1",
+    # Compiled SQL is reused across requests; every route runs the same handful of statements
+    "query_cache_size": int(os.environ.get("DB_QUERY_CACHE_SIZE", 1200)),
+    "json_serializer": fastjson.dumps,
+    "json_deserializer": fastjson.loads,
 }
+if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # Size the pool for concurrent workers; the database needs matching max_connections
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 30)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": 10,
+    })
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith(("postgres://", "postgresql")):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {
+        "options": f"-c statement_timeout={os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000)}"
+    }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ECHO"] = False
+
+# Cap request bodies; every JSON payload in the API is small
+app.config['MAX_CONTENT_LENGTH'] = 256 * 1024
 
 # Initialize extensions
 db.init_app(app)
@@ -70,16 +107,16 @@ with app.app_context():
     # Initialize sample data
     models.init_sample_data()
 
+with open(os.path.join(app.root_path, 'openapi.yaml'), 'rb') as spec_file:
+    _OPENAPI_BYTES = spec_file.read()
+_OPENAPI_ETAG = make_etag(_OPENAPI_BYTES)
+
 @app.route('/openapi.yaml')
 def get_openapi_spec():
     """Serve the OpenAPI specification"""
-    from flask import send_file
-    return send_file('openapi.yaml', mimetype='text/yaml')
+    return conditional_response(_OPENAPI_BYTES, 'text/yaml', etag=_OPENAPI_ETAG, max_age=300)
 
-@app.route('/')
-def index():
-    """Home page with API documentation"""
-    return """
+_INDEX_BYTES = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -111,12 +148,37 @@ def index():
         </div>
     </body>
     </html>
-    """
+    """.encode('utf-8')
+_INDEX_ETAG = make_etag(_INDEX_BYTES)
+
+@app.route('/')
+def index():
+    """Home page with API documentation"""
+    return conditional_response(_INDEX_BYTES, 'text/html', etag=_INDEX_ETAG, max_age=3600)
+
+@app.before_request
+def reject_oversized_body():
+    """Refuse oversized bodies before any handler reads them"""
+    if (request.content_length or 0) > app.config['MAX_CONTENT_LENGTH']:
+        abort(413)
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({'error': 'Not found'}), 404
+    return jresp({'error': 'Not found'}, 404)
+
+@app.errorhandler(413)
+def payload_too_large(error):
+    return jresp({'error': 'Request body too large'}, 413)
 
 @app.errorhandler(500)
 def internal_error(error):
-    return jsonify({'error': 'Internal server error'}), 500
+    return jresp({'error': 'Internal server error'}, 500)
+
+@app.errorhandler(HTTPException)
+def http_error(error):
+    return jresp({'error': error.description}, error.code)
+
+@app.errorhandler(Exception)
+def unhandled_error(error):
+    logging.exception("Unhandled error on %s: %s", request.path, error)
+    return jresp({'error': 'Server error'}, 500)
@@ -0,0 +1,188 @@
+"""
+Legacy Database Upgrade
+Brings a database created by an earlier release up to the current models
+
+db.create_all() only creates missing tables, so existing tables keep their old column
+types, ids and indexes. Every step below checks the live schema first, so the script
+can be re-run safely. Run from the project root with the app's DATABASE_URL:
+
+    python -m migrations.upgrade_legacy_db
+"""
+import logging
+import os
+
+# The upgrade only reshapes existing data; don't seed factions into a half-migrated schema
+os.environ.setdefault('GALAXY_SKIP_BOOTSTRAP', '1')
+
+from sqlalchemy import UniqueConstraint, Uuid, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from app import app, db
+from models import CanvasEntry, FactionState, JSONType, SessionState
+
+
+def _columns(conn, table):
+    return {column['name']: column for column in inspect(conn).get_columns(table)}
+
+
+def _json_columns():
+    """(table, column) for every column mapped with JSONType"""
+    return [
+        (table.name, column.name)
+        for table in db.metadata.sorted_tables
+        for column in table.columns
+        if column.type is JSONType
+    ]
+
+
+def _uuid_key_tables():
+    return [table.name for table in db.metadata.sorted_tables if 'id' in table.c and isinstance(table.c.id.type, Uuid)]
+
+
+def convert_json_columns(conn):
+    """Text JSON columns become jsonb on PostgreSQL; SQLite stores JSON as text already"""
+    if conn.dialect.name != 'postgresql':
+        return
+    for table, column in _json_columns():
+        if not isinstance(_columns(conn, table)[column]['type'], JSONB):
+            logging.info("Converting %s.%s to jsonb", table, column)
+            conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb'))
+
+
+def convert_uuid_keys(conn):
+    """String(36) ids become native uuid on PostgreSQL and 32-char hex on SQLite"""
+    for table in _uuid_key_tables():
+        if conn.dialect.name == 'postgresql':
+            if not isinstance(_columns(conn, table)['id']['type'], Uuid):
+                logging.info("Converting %s.id to uuid", table)
+                conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN id TYPE uuid USING id::uuid'))
+        else:
+            result = conn.execute(text(f"UPDATE {table} SET id = replace(id, '-', '') WHERE id LIKE '%-%'"))
+            if result.rowcount:
+                logging.info("Rewrote %d dashed ids in %s", result.rowcount, table)
+
+
+def add_canvas_filter_columns(conn):
+    """Add the campaign and force_alignment columns and fill them from meta"""
+    table = CanvasEntry.__tablename__
+    existing = _columns(conn, table)
+    added = False
+    for column in ('campaign', 'force_alignment'):
+        if column not in existing:
+            length = CanvasEntry.__table__.c[column].type.length
+            logging.info("Adding %s.%s", table, column)
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} VARCHAR({length})'))
+            added = True
+    if not added:
+        return
+
+    if conn.dialect.name == 'postgresql':
+        campaign, alignment = "meta->>'campaign'", "meta->>'force_alignment'"
+    else:
+        campaign, alignment = "json_extract(meta, '$.campaign')", "json_extract(meta, '$.force_alignment')"
+    conn.execute(text(
+        f'UPDATE {table} SET campaign = {campaign}, force_alignment = {alignment} '
+        'WHERE campaign IS NULL AND force_alignment IS NULL'
+    ))
+
+
+# Earlier indexes and constraints over the same faction columns
+REPLACED_FACTION_KEYS = ('ix_faction_name_user', 'uq_faction_name_user')
+
+
+def add_faction_unique_constraint(conn):
+    """Merge duplicate faction rows, then add the unique constraint the reputation upsert targets"""
+    table = FactionState.__tablename__
+    constraint = next(c for c in FactionState.__table__.constraints if isinstance(c, UniqueConstraint))
+    columns = ', '.join(f'"{column.name}"' for column in constraint.columns)
+    inspector = inspect(conn)
+    indexes = {index['name'] for index in inspector.get_indexes(table)}
+    constraints = {c['name'] for c in inspector.get_unique_constraints(table)}
+
+    for name in REPLACED_FACTION_KEYS:
+        if name in constraints:
+            # SQLite can't drop a table constraint; the leftover one only duplicates the new one
+            if conn.dialect.name == 'postgresql':
+                logging.info("Dropping constraint %s", name)
+                conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {name}'))
+        elif name in indexes:
+            logging.info("Dropping index %s", name)
+            conn.execute(text(f'DROP INDEX {name}'))
+    if constraint.name in constraints or constraint.name in indexes:
+        return
+
+    # Keep the most recently touched row of each duplicate group
+    result = conn.execute(text(
+        f'DELETE FROM {table} WHERE id NOT IN ('
+        f'  SELECT id FROM ('
+        f'    SELECT id, ROW_NUMBER() OVER ('
+        f'      PARTITION BY {columns} ORDER BY last_interaction DESC, id DESC'
+        f'    ) AS rn FROM {table}'
+        f'  ) ranked WHERE rn = 1'
+        f')'
+    ))
+    logging.info("Removed %d duplicate faction rows", result.rowcount)
+
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {constraint.name} UNIQUE ({columns})'))
+    else:
+        # SQLite can't add constraints to a table; ON CONFLICT accepts a unique index instead
+        conn.execute(text(f'CREATE UNIQUE INDEX {constraint.name} ON {table} ({columns})'))
+
+
+def backfill_session_users(conn):
+    """Copy the legacy session_states.users JSON lists into session_users"""
+    if 'users' not in _columns(conn, SessionState.__tablename__):
+        return
+
+    if conn.dialect.name == 'postgresql':
+        stmt = (
+            'INSERT INTO session_users (session_id, "user", joined_at) '
+            'SELECT s.session_id, u.value, s.created_at '
+            'FROM session_states s, jsonb_array_elements_text(CAST(s.users AS jsonb)) u '
+            'WHERE s.users IS NOT NULL ON CONFLICT DO NOTHING'
+        )
+    else:
+        stmt = (
+            'INSERT OR IGNORE INTO session_users (session_id, "user", joined_at) '
+            'SELECT s.session_id, u.value, s.created_at '
+            'FROM session_states s, json_each(s.users) u '
+            'WHERE json_valid(s.users)'
+        )
+    result = conn.execute(text(stmt))
+    # Clear the copied lists so a re-run can't re-add players who have since left
+    conn.execute(text('UPDATE session_states SET users = NULL'))
+    logging.info("Backfilled %d session memberships; session_states.users is no longer read", result.rowcount)
+
+
+def create_missing_indexes(conn):
+    """Indexes declared on the models after their tables were first created"""
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logging.info("Creating index %s", index.name)
+                index.create(conn)
+
+
+STEPS = (
+    convert_json_columns,
+    convert_uuid_keys,
+    add_canvas_filter_columns,
+    add_faction_unique_constraint,
+    backfill_session_users,
+    create_missing_indexes,
+)
+
+
+def upgrade():
+    """Run every step in one transaction"""
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            for step in STEPS:
+                step(conn)
+
+
+if __name__ == '__main__':
+    upgrade()
+    logging.info("Database upgrade complete")
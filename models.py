@@ -1,32 +1,51 @@
 from app import db
 from datetime import datetime
-import json
+import os
+from sqlalchemy.dialects.postgresql import JSONB
 import uuid
 
+# Native JSON storage; JSONB on PostgreSQL
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
+
+def parse_uuid(value):
+    """Parse a client-supplied primary key, returning None if it isn't a UUID"""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
 class CanvasEntry(db.Model):
     __tablename__ = 'canvas_entries'
+    __table_args__ = (
+        db.Index('ix_canvas_type_user_ts', 'canvas', 'user', 'timestamp'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     canvas = db.Column(db.String(100), nullable=False)
     user = db.Column(db.String(100), nullable=False)
-    data = db.Column(db.Text, nullable=False)  # JSON string
-    meta = db.Column(db.Text, nullable=False)  # JSON string
+    data = db.Column(JSONType, nullable=False)
+    meta = db.Column(JSONType, nullable=False)
+    campaign = db.Column(db.String(100), index=True)  # Copied from meta for filtering
+    force_alignment = db.Column(db.String(20), index=True)  # Copied from meta for filtering
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'canvas': self.canvas,
             'user': self.user,
-            'data': json.loads(self.data),
-            'meta': json.loads(self.meta),
-            'timestamp': self.timestamp.isoformat() + 'Z'
+            'data': self.data,
+            'meta': self.meta,
+            'timestamp': self.timestamp
         }
 
 class PlayerCharacter(db.Model):
     __tablename__ = 'player_characters'
+    __table_args__ = (
+        db.Index('ix_player_user', 'user'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     user = db.Column(db.String(100), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     species = db.Column(db.String(50))
@@ -36,17 +55,17 @@ class PlayerCharacter(db.Model):
     force_sensitive = db.Column(db.String(20))
     force_alignment = db.Column(db.String(20))
     appearance = db.Column(db.Text)
-    equipment = db.Column(db.Text)  # JSON string
-    skills = db.Column(db.Text)  # JSON string
+    equipment = db.Column(JSONType)
+    skills = db.Column(JSONType)
     personal_goal = db.Column(db.Text)
     contacts = db.Column(db.Text)
-    faction_reputation = db.Column(db.Text)  # JSON string
+    faction_reputation = db.Column(JSONType)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'user': self.user,
             'name': self.name,
             'species': self.species,
@@ -56,105 +75,146 @@ class PlayerCharacter(db.Model):
             'force_sensitive': self.force_sensitive,
             'force_alignment': self.force_alignment,
             'appearance': self.appearance,
-            'equipment': json.loads(self.equipment) if self.equipment else {},
-            'skills': json.loads(self.skills) if self.skills else [],
+            'equipment': self.equipment or {},
+            'skills': self.skills or [],
             'personal_goal': self.personal_goal,
             'contacts': self.contacts,
-            'faction_reputation': json.loads(self.faction_reputation) if self.faction_reputation else {},
-            'created_at': self.created_at.isoformat() + 'Z',
-            'updated_at': self.updated_at.isoformat() + 'Z'
+            'faction_reputation': self.faction_reputation or {},
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class FactionState(db.Model):
     __tablename__ = 'faction_states'
+    __table_args__ = (
+        db.UniqueConstraint('user', 'faction_name', name='uq_faction_user_name'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     faction_name = db.Column(db.String(100), nullable=False)
     user = db.Column(db.String(100), nullable=False)
     reputation = db.Column(db.Integer, default=0)
     awareness = db.Column(db.Integer, default=0)
     resources = db.Column(db.Integer, default=100)
-    goals = db.Column(db.Text)  # JSON string
-    active_operations = db.Column(db.Text)  # JSON string
+    goals = db.Column(JSONType)
+    active_operations = db.Column(JSONType)
     last_interaction = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'faction_name': self.faction_name,
             'user': self.user,
             'reputation': self.reputation,
             'awareness': self.awareness,
             'resources': self.resources,
-            'goals': json.loads(self.goals) if self.goals else [],
-            'active_operations': json.loads(self.active_operations) if self.active_operations else [],
-            'last_interaction': self.last_interaction.isoformat() + 'Z'
+            'goals': self.goals or [],
+            'active_operations': self.active_operations or [],
+            'last_interaction': self.last_interaction
         }
 
 class QuestLog(db.Model):
     __tablename__ = 'quest_logs'
+    __table_args__ = (
+        db.Index('ix_quest_user_created', 'user', 'created_at'),
+        db.Index('ix_quest_user_status_created', 'user', 'status', 'created_at'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     user = db.Column(db.String(100), nullable=False)
     quest_title = db.Column(db.String(200), nullable=False)
     quest_type = db.Column(db.String(50))
     description = db.Column(db.Text)
-    objectives = db.Column(db.Text)  # JSON string
-    rewards = db.Column(db.Text)  # JSON string
+    objectives = db.Column(JSONType)
+    rewards = db.Column(JSONType)
     status = db.Column(db.String(20), default='active')
     difficulty = db.Column(db.String(20))
-    faction_involvement = db.Column(db.Text)  # JSON string
+    faction_involvement = db.Column(JSONType)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'user': self.user,
             'quest_title': self.quest_title,
             'quest_type': self.quest_type,
             'description': self.description,
-            'objectives': json.loads(self.objectives) if self.objectives else [],
-            'rewards': json.loads(self.rewards) if self.rewards else [],
+            'objectives': self.objectives or [],
+            'rewards': self.rewards or [],
             'status': self.status,
             'difficulty': self.difficulty,
-            'faction_involvement': json.loads(self.faction_involvement) if self.faction_involvement else [],
-            'created_at': self.created_at.isoformat() + 'Z',
-            'completed_at': self.completed_at.isoformat() + 'Z' if self.completed_at else None
+            'faction_involvement': self.faction_involvement or [],
+            'created_at': self.created_at,
+            'completed_at': self.completed_at
         }
 
 class SessionState(db.Model):
     __tablename__ = 'session_states'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     session_id = db.Column(db.String(100), nullable=False, unique=True)
-    users = db.Column(db.Text)  # JSON string
     current_location = db.Column(db.String(100))
     active_scene = db.Column(db.String(100))
-    session_data = db.Column(db.Text)  # JSON string
+    session_data = db.Column(JSONType)
     galaxy_momentum = db.Column(db.Integer, default=0)
-    force_events = db.Column(db.Text)  # JSON string
+    force_events = db.Column(JSONType)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_active = db.Column(db.DateTime, default=datetime.utcnow)
+    members = db.relationship(
+        'SessionUser',
+        lazy='raise_on_sql',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        order_by='(SessionUser.joined_at, SessionUser.user)'
+    )
+    
+    @property
+    def users(self):
+        return [member.user for member in self.members]
+    
+    @users.setter
+    def users(self, names):
+        # Keep existing membership rows (and their join times) for names that stay
+        existing = {member.user: member for member in self.members}
+        now = datetime.utcnow()
+        members = [existing.get(name) or SessionUser(user=name, joined_at=now) for name in dict.fromkeys(names or [])]
+        # Same (joined_at, user) order members reloads in, so a write echoes what a later read returns
+        self.members = sorted(members, key=lambda member: (member.joined_at or datetime.min, member.user))
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'session_id': self.session_id,
-            'users': json.loads(self.users) if self.users else [],
+            'users': self.users,
             'current_location': self.current_location,
             'active_scene': self.active_scene,
-            'session_data': json.loads(self.session_data) if self.session_data else {},
+            'session_data': self.session_data or {},
             'galaxy_momentum': self.galaxy_momentum,
-            'force_events': json.loads(self.force_events) if self.force_events else [],
-            'created_at': self.created_at.isoformat() + 'Z',
-            'last_active': self.last_active.isoformat() + 'Z'
+            'force_events': self.force_events or [],
+            'created_at': self.created_at,
+            'last_active': self.last_active
         }
 
+class SessionUser(db.Model):
+    __tablename__ = 'session_users'
+    
+    session_id = db.Column(
+        db.String(100),
+        db.ForeignKey('session_states.session_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    user = db.Column(db.String(100), primary_key=True)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class NPCInteraction(db.Model):
     __tablename__ = 'npc_interactions'
+    __table_args__ = (
+        db.Index('ix_npc_user_ts', 'user', 'timestamp'),
+        db.Index('ix_npc_user_name_ts', 'user', 'npc_name', 'timestamp'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     user = db.Column(db.String(100), nullable=False)
     npc_name = db.Column(db.String(100), nullable=False)
     npc_type = db.Column(db.String(50))
@@ -167,7 +227,7 @@ class NPCInteraction(db.Model):
     
     def to_dict(self):
         return {
-            'id': self.id,
+            'id': str(self.id),
             'user': self.user,
             'npc_name': self.npc_name,
             'npc_type': self.npc_type,
@@ -176,44 +236,53 @@ class NPCInteraction(db.Model):
             'npc_response': self.npc_response,
             'sentiment': self.sentiment,
             'memory_tier': self.memory_tier,
-            'timestamp': self.timestamp.isoformat() + 'Z'
+            'timestamp': self.timestamp
         }
 
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.String(20), nullable=False, default='pending')  # pending, done or failed
+    result = db.Column(JSONType)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# System faction seed rows, inserted in one statement on first start
+_FACTION_ROWS = [
+    {
+        'faction_name': 'Galactic Empire',
+        'user': 'system',
+        'reputation': 0,
+        'awareness': 0,
+        'resources': 1000,
+        'goals': ['Maintain order', 'Eliminate Rebellion', 'Enforce Imperial law'],
+        'active_operations': ['Patrol routes', 'Intelligence gathering']
+    },
+    {
+        'faction_name': 'Rebel Alliance',
+        'user': 'system',
+        'reputation': 0,
+        'awareness': 0,
+        'resources': 500,
+        'goals': ['Overthrow Empire', 'Restore Republic', 'Protect civilians'],
+        'active_operations': ['Recruitment', 'Sabotage missions']
+    },
+    {
+        'faction_name': 'Corporate Sector Authority',
+        'user': 'system',
+        'reputation': 0,
+        'awareness': 0,
+        'resources': 800,
+        'goals': ['Maximize profits', 'Maintain trade routes', 'Expand influence'],
+        'active_operations': ['Trade negotiations', 'Security enforcement']
+    }
+]
+
 def init_sample_data():
     """Initialize the database with Star Wars faction data"""
-    if FactionState.query.count() == 0:
-        factions = [
-            {
-                'faction_name': 'Galactic Empire',
-                'user': 'system',
-                'reputation': 0,
-                'awareness': 0,
-                'resources': 1000,
-                'goals': json.dumps(['Maintain order', 'Eliminate Rebellion', 'Enforce Imperial law']),
-                'active_operations': json.dumps(['Patrol routes', 'Intelligence gathering'])
-            },
-            {
-                'faction_name': 'Rebel Alliance',
-                'user': 'system',
-                'reputation': 0,
-                'awareness': 0,
-                'resources': 500,
-                'goals': json.dumps(['Overthrow Empire', 'Restore Republic', 'Protect civilians']),
-                'active_operations': json.dumps(['Recruitment', 'Sabotage missions'])
-            },
-            {
-                'faction_name': 'Corporate Sector Authority',
-                'user': 'system',
-                'reputation': 0,
-                'awareness': 0,
-                'resources': 800,
-                'goals': json.dumps(['Maximize profits', 'Maintain trade routes', 'Expand influence']),
-                'active_operations': json.dumps(['Trade negotiations', 'Security enforcement'])
-            }
-        ]
-        
-        for faction_data in factions:
-            faction = FactionState(**faction_data)
-            db.session.add(faction)
-        
+    if os.environ.get('GALAXY_SKIP_BOOTSTRAP') == '1':
+        return
+    
+    if not db.session.query(db.session.query(FactionState.id).exists()).scalar():
+        db.session.execute(FactionState.__table__.insert(), _FACTION_ROWS)
         db.session.commit()
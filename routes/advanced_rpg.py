@@ -2,161 +2,236 @@
 Advanced RPG Mechanics Routes
 Real-time faction AI, procedural quests, multiplayer sessions, and Force morality
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from sqlalchemy import update, case
 from app import db
-import json
+from utils.http import fast_json_body, jresp, json_conditional_response
 import logging
 from datetime import datetime
-
-# Import our advanced RPG services
-from services.faction_ai_service import faction_ai
-from services.quest_engine import quest_engine
-from services.session_manager import session_manager
-from services.force_morality_engine import force_engine
+from dataclasses import asdict
 
 bp = Blueprint('advanced_rpg', __name__)
 
+def _run_faction_ai_turn(faction_name, galaxy_events):
+    """Run one AI turn and apply it to the faction row; None if the faction does not exist"""
+    from models import FactionState
+    from services import faction_cache
+    from services.faction_ai_service import faction_ai
+    faction_state = FactionState.query.filter_by(faction_name=faction_name).first()
+    if not faction_state:
+        return None
+    
+    current_state = faction_state.to_dict()
+    
+    # Process AI turn
+    turn_result = faction_ai.process_faction_turn(faction_name, current_state, galaxy_events)
+    
+    # Apply the turn atomically and read the new row back in the same statement
+    resource_changes = turn_result.get('resource_changes', 0)
+    if not isinstance(resource_changes, dict):
+        resource_changes = {'resources': resource_changes}
+    new_awareness = FactionState.awareness + resource_changes.get('awareness', 0)
+    updated_faction = db.session.execute(
+        update(FactionState)
+        .where(FactionState.id == faction_state.id)
+        .values(
+            reputation=FactionState.reputation + resource_changes.get('reputation', 0),
+            resources=FactionState.resources + resource_changes.get('resources', 0),
+            awareness=case((new_awareness > 100, 100), else_=new_awareness),
+            last_interaction=datetime.utcnow()
+        )
+        .returning(FactionState)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    ).scalar_one()
+    db.session.commit()
+    faction_cache.invalidate()
+    
+    return {
+        'status': 'success',
+        'faction_turn': turn_result,
+        'updated_state': updated_faction.to_dict()
+    }
+
 @bp.route('/faction_ai_turn', methods=['POST'])
 def process_faction_ai_turn():
     """Process real-time faction AI turn with intelligent responses"""
-    try:
-        data = request.get_json()
-        if not data or 'faction' not in data:
-            return jsonify({'error': 'Missing faction parameter'}), 400
-        
-        faction_name = data['faction']
-        galaxy_events = data.get('galaxy_events', [])
-        
-        # Get current faction state from database
+    data = fast_json_body()
+    if not data or 'faction' not in data:
+        return jresp({'error': 'Missing faction parameter'}, 400)
+    
+    faction_name = data['faction']
+    galaxy_events = data.get('galaxy_events', [])
+    
+    if data.get('async'):
+        # Queue the turn and let the client poll /faction_turn_status for the result
         from models import FactionState
-        faction_state = FactionState.query.filter_by(faction_name=faction_name).first()
-        if not faction_state:
-            return jsonify({'error': f'Faction {faction_name} not found'}), 404
-        
-        current_state = faction_state.to_dict()
-        
-        # Process AI turn
-        turn_result = faction_ai.process_faction_turn(faction_name, current_state, galaxy_events)
-        
-        # Update faction state in database
-        faction_state.reputation += turn_result.get('resource_changes', {}).get('reputation', 0)
-        faction_state.resources += turn_result.get('resource_changes', {}).get('resources', 0)
-        faction_state.awareness = min(100, faction_state.awareness + turn_result.get('resource_changes', {}).get('awareness', 0))
-        faction_state.last_interaction = datetime.utcnow()
-        
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'faction_turn': turn_result,
-            'updated_state': faction_state.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error in faction AI turn: {str(e)}")
-        return jsonify({'error': 'Server error processing faction turn'}), 500
+        from services import task_queue
+        if not db.session.query(FactionState.query.filter_by(faction_name=faction_name).exists()).scalar():
+            return jresp({'error': f'Faction {faction_name} not found'}, 404)
+        
+        job_id = task_queue.submit(_run_faction_ai_turn, faction_name, galaxy_events)
+        return jresp({'status': 'queued', 'job_id': job_id}, 202)
+    
+    result = _run_faction_ai_turn(faction_name, galaxy_events)
+    if result is None:
+        return jresp({'error': f'Faction {faction_name} not found'}, 404)
+    
+    return jresp(result)
+
+@bp.route('/faction_turn_status/<job_id>', methods=['GET'])
+def faction_turn_status(job_id):
+    """Poll a queued faction AI turn"""
+    from services import task_queue
+    job = task_queue.get(job_id)
+    if job is None:
+        return jresp({'error': 'Job not found'}, 404)
+    
+    if job['state'] == 'done':
+        return jresp(job['result'])
+    if job['state'] == 'failed':
+        return jresp({'status': 'failed', 'job_id': job_id}, 500)
+    
+    return jresp({'status': 'pending', 'job_id': job_id}, 202)
 
 @bp.route('/generate_adaptive_quest', methods=['POST'])
 def generate_adaptive_quest():
     """Generate procedural quest that adapts to current galaxy state"""
-    try:
-        data = request.get_json()
-        if not data or 'user' not in data:
-            return jsonify({'error': 'Missing user parameter'}), 400
-        
-        user = data['user']
-        
-        # Get current faction states
-        from models import FactionState, QuestLog
-        faction_states = {}
-        factions = FactionState.query.all()
-        for faction in factions:
-            faction_states[faction.faction_name] = faction.to_dict()
-        
-        # Get player quest history
-        player_history = QuestLog.query.filter_by(user=user).order_by(QuestLog.created_at.desc()).limit(20).all()
-        quest_history = [quest.to_dict() for quest in player_history]
-        
-        # Get Force alignment if available
-        force_alignment = data.get('force_alignment', {'light': 0, 'dark': 0, 'balance': 100})
-        
-        # Generate adaptive quest
+    data = fast_json_body()
+    if not data or 'user' not in data:
+        return jresp({'error': 'Missing user parameter'}, 400)
+    
+    user = data['user']
+    
+    # Get current faction states
+    from models import QuestLog
+    from services import faction_cache
+    from services.quest_engine import quest_engine
+    faction_states = faction_cache.get_states()
+    
+    # Get player quest history as plain rows, skipping ORM object hydration
+    quest_table = QuestLog.__table__
+    quest_history = [dict(row) for row in db.session.execute(
+        db.select(quest_table)
+        .where(quest_table.c.user == user)
+        .order_by(quest_table.c.created_at.desc())
+        .limit(20)
+    ).mappings()]
+    
+    # Get Force alignment if available
+    force_alignment = data.get('force_alignment', {'light': 0, 'dark': 0, 'balance': 100})
+    
+    # Generate adaptive quest; async callers get it back before the AI narrative is written
+    narrate_async = bool(data.get('async'))
+    if narrate_async:
+        quest_data, narrative_input = quest_engine.build_adaptive_quest(user, faction_states, quest_history, force_alignment)
+    else:
         quest_data = quest_engine.generate_adaptive_quest(user, faction_states, quest_history, force_alignment)
-        
-        # Save quest to database
-        new_quest = QuestLog(
-            user=user,
-            quest_title=quest_data['quest_title'],
-            quest_type=quest_data['quest_type'],
-            description=quest_data['description'],
-            objectives=json.dumps(quest_data['objectives']),
-            rewards=json.dumps(quest_data['rewards']),
-            status='active',
-            difficulty=quest_data['difficulty'],
-            faction_involvement=json.dumps(quest_data['faction_involvement'])
-        )
-        
-        db.session.add(new_quest)
-        db.session.commit()
-        
-        # Add quest ID to response
-        quest_data['id'] = new_quest.id
-        
-        return jsonify({
+    
+    # Save quest to database
+    new_quest = QuestLog(
+        user=user,
+        quest_title=quest_data['quest_title'],
+        quest_type=quest_data['quest_type'],
+        description=quest_data['description'],
+        objectives=quest_data['objectives'],
+        rewards=quest_data['rewards'],
+        status='active',
+        difficulty=quest_data['difficulty'],
+        faction_involvement=quest_data['faction_involvement']
+    )
+    
+    db.session.add(new_quest)
+    db.session.commit()
+    
+    # Add quest ID to response
+    quest_data['id'] = str(new_quest.id)
+    
+    if narrate_async:
+        # The placeholder description is replaced once the narrative job finishes
+        from services import task_queue
+        job_id = task_queue.submit(_narrate_adaptive_quest, new_quest.id, narrative_input)
+        return jresp({
             'status': 'success',
-            'quest': quest_data
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error generating adaptive quest: {str(e)}")
-        return jsonify({'error': 'Server error generating quest'}), 500
+            'quest': quest_data,
+            'narrative_job_id': job_id
+        }, 202)
+    
+    return jresp({
+        'status': 'success',
+        'quest': quest_data
+    })
+
+def _narrate_adaptive_quest(quest_id, narrative_input):
+    """Write the AI narrative onto a saved adaptive quest"""
+    from models import QuestLog
+    from services.quest_engine import quest_engine
+    description = quest_engine.narrate_quest(narrative_input)
+    db.session.execute(
+        update(QuestLog).where(QuestLog.id == quest_id).values(description=description)
+    )
+    db.session.commit()
+    
+    return {'quest_id': str(quest_id), 'description': description}
+
+@bp.route('/quest_narrative_status/<job_id>', methods=['GET'])
+def quest_narrative_status(job_id):
+    """Poll the narrative for an adaptive quest created with async"""
+    from services import task_queue
+    job = task_queue.get(job_id)
+    if job is None:
+        return jresp({'error': 'Job not found'}, 404)
+    
+    if job['state'] == 'done':
+        return jresp({'status': 'success', **job['result']})
+    if job['state'] == 'failed':
+        return jresp({'status': 'failed', 'job_id': job_id}, 500)
+    
+    return jresp({'status': 'pending', 'job_id': job_id}, 202)
 
 @bp.route('/create_multiplayer_session', methods=['POST'])
 def create_multiplayer_session():
     """Create new multiplayer session with persistent world state"""
-    try:
-        data = request.get_json()
-        if not data or 'session_id' not in data or 'session_master' not in data:
-            return jsonify({'error': 'Missing session_id or session_master'}), 400
-        
-        session_id = data['session_id']
-        session_master = data['session_master']
-        initial_config = data.get('config', {})
-        
-        # Create session world state
-        world_state = session_manager.create_session(session_id, session_master, initial_config)
-        
-        # Save session to database
-        from models import SessionState
-        session_record = SessionState(
-            session_id=session_id,
-            users=json.dumps([session_master]),
-            current_location=initial_config.get('starting_location', 'Coruscant'),
-            active_scene=initial_config.get('starting_scene', 'Campaign Beginning'),
-            session_data=json.dumps(world_state.__dict__),
-            galaxy_momentum=0
-        )
-        
-        db.session.add(session_record)
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session_state': world_state.__dict__,
-            'message': f'Multiplayer session {session_id} created successfully'
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error creating multiplayer session: {str(e)}")
-        return jsonify({'error': 'Server error creating session'}), 500
+    from services.session_manager import session_manager
+    data = fast_json_body()
+    if not data or 'session_id' not in data or 'session_master' not in data:
+        return jresp({'error': 'Missing session_id or session_master'}, 400)
+    
+    session_id = data['session_id']
+    session_master = data['session_master']
+    initial_config = data.get('config', {})
+    
+    # Create session world state
+    world_state = session_manager.create_session(session_id, session_master, initial_config)
+    
+    # Save session to database
+    from models import SessionState
+    world_state_data = asdict(world_state)
+    session_record = SessionState(
+        session_id=session_id,
+        users=[session_master],
+        current_location=initial_config.get('starting_location', 'Coruscant'),
+        active_scene=initial_config.get('starting_scene', 'Campaign Beginning'),
+        session_data=world_state_data,
+        galaxy_momentum=0
+    )
+    
+    db.session.add(session_record)
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'session_state': world_state_data,
+        'message': f'Multiplayer session {session_id} created successfully'
+    })
 
 @bp.route('/join_session', methods=['POST'])
 def join_session():
     """Join existing multiplayer session"""
     try:
-        data = request.get_json()
+        from services.session_manager import session_manager
+        data = fast_json_body()
         if not data or 'session_id' not in data or 'player_id' not in data:
-            return jsonify({'error': 'Missing session_id or player_id'}), 400
+            return jresp({'error': 'Missing session_id or player_id'}, 400)
         
         session_id = data['session_id']
         player_id = data['player_id']
@@ -167,111 +242,132 @@ def join_session():
         
         # Update database session record
         from models import SessionState
+        from services import session_users
         session_record = SessionState.query.filter_by(session_id=session_id).first()
-        if session_record:
-            current_users = json.loads(session_record.users) if session_record.users else []
-            if player_id not in current_users:
-                current_users.append(player_id)
-                session_record.users = json.dumps(current_users)
-                session_record.last_active = datetime.utcnow()
-                db.session.commit()
+        if session_record and session_users.add_user(session_record, player_id):
+            db.session.commit()
         
-        return jsonify({
+        return jresp({
             'status': 'success',
-            'player_state': player_state.__dict__,
+            'player_state': asdict(player_state),
             'session_info': session_manager.sync_session_state(session_id)
-        }), 200
+        })
         
-    except Exception as e:
-        logging.error(f"Error joining session: {str(e)}")
-        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        logging.error("Error joining session: %s", e)
+        return jresp({'error': str(e)}, 400)
 
 @bp.route('/process_moral_choice', methods=['POST'])
 def process_moral_choice():
     """Process Force morality choice with narrative consequences"""
-    try:
-        data = request.get_json()
-        if not data or 'user' not in data or 'choice' not in data:
-            return jsonify({'error': 'Missing user or choice parameters'}), 400
-        
-        user_id = data['user']
-        selected_choice = data['choice']  # 'light', 'dark', or 'balance'
-        choice_context = data.get('context', {})
-        
-        # Process moral choice through Force engine
-        moral_result = force_engine.process_moral_choice(user_id, choice_context, selected_choice)
-        
-        # Update player character Force alignment if exists
-        from models import PlayerCharacter
-        character = PlayerCharacter.query.filter_by(user=user_id).first()
-        if character:
-            character.force_alignment = moral_result['new_alignment']
-            character.updated_at = datetime.utcnow()
-            db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'moral_result': moral_result,
-            'message': 'Force alignment and destiny threads updated'
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error processing moral choice: {str(e)}")
-        return jsonify({'error': 'Server error processing moral choice'}), 500
+    from services.force_morality_engine import force_engine
+    data = fast_json_body()
+    if not data or 'user' not in data or 'choice' not in data:
+        return jresp({'error': 'Missing user or choice parameters'}, 400)
+    
+    user_id = data['user']
+    selected_choice = data['choice']  # 'light', 'dark', or 'balance'
+    choice_context = data.get('context', {})
+    
+    # Process moral choice through Force engine
+    moral_result = force_engine.process_moral_choice(user_id, choice_context, selected_choice)
+    
+    # Update player character Force alignment if exists
+    from models import PlayerCharacter
+    from services import character_cache
+    character = PlayerCharacter.query.filter_by(user=user_id).first()
+    if character:
+        character.force_alignment = moral_result['new_alignment']
+        character.updated_at = datetime.utcnow()
+        db.session.commit()
+        character_cache.invalidate(user_id)
+    
+    return jresp({
+        'status': 'success',
+        'moral_result': moral_result,
+        'message': 'Force alignment and destiny threads updated'
+    })
 
 @bp.route('/generate_force_vision', methods=['POST'])
 def generate_force_vision():
     """Generate AI-powered Force vision based on moral trajectory"""
-    try:
-        data = request.get_json()
-        if not data or 'user' not in data:
-            return jsonify({'error': 'Missing user parameter'}), 400
-        
-        user_id = data['user']
-        vision_context = data.get('context', {})
-        
-        # Generate Force vision
-        vision_result = force_engine.generate_force_vision(user_id, vision_context)
-        
-        if 'error' in vision_result:
-            return jsonify(vision_result), 400
-        
-        return jsonify({
+    from services.force_morality_engine import force_engine
+    data = fast_json_body()
+    if not data or 'user' not in data:
+        return jresp({'error': 'Missing user parameter'}, 400)
+    
+    user_id = data['user']
+    vision_context = data.get('context', {})
+    
+    if data.get('async'):
+        # The narrative is an LLM round-trip; queue it and let the client poll /force_vision_status
+        from services import task_queue
+        if user_id not in force_engine.force_profiles:
+            return jresp({'error': 'No Force profile found'}, 400)
+        
+        job_id = task_queue.submit(force_engine.generate_force_vision, user_id, vision_context)
+        return jresp({'status': 'queued', 'job_id': job_id}, 202)
+    
+    # Generate Force vision
+    vision_result = force_engine.generate_force_vision(user_id, vision_context)
+    
+    if 'error' in vision_result:
+        return jresp(vision_result, 400)
+    
+    return jresp({
+        'status': 'success',
+        'force_vision': vision_result
+    })
+
+@bp.route('/force_vision_status/<job_id>', methods=['GET'])
+def force_vision_status(job_id):
+    """Poll a queued Force vision"""
+    from services import task_queue
+    job = task_queue.get(job_id)
+    if job is None:
+        return jresp({'error': 'Job not found'}, 404)
+    
+    if job['state'] == 'done':
+        if 'error' in job['result']:
+            return jresp(job['result'], 400)
+        return jresp({
             'status': 'success',
-            'force_vision': vision_result
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error generating Force vision: {str(e)}")
-        return jsonify({'error': 'Server error generating vision'}), 500
+            'force_vision': job['result']
+        })
+    if job['state'] == 'failed':
+        return jresp({'status': 'failed', 'job_id': job_id}, 500)
+    
+    return jresp({'status': 'pending', 'job_id': job_id}, 202)
 
 @bp.route('/sync_session_state', methods=['GET'])
 def sync_session_state():
     """Get complete session state for all connected players"""
     try:
+        from services.session_manager import session_manager
         session_id = request.args.get('session_id')
         if not session_id:
-            return jsonify({'error': 'Missing session_id parameter'}), 400
+            return jresp({'error': 'Missing session_id parameter'}, 400)
         
         # Get synchronized session state
         session_state = session_manager.sync_session_state(session_id)
         
-        return jsonify({
+        return json_conditional_response({
             'status': 'success',
             'session_sync': session_state
-        }), 200
+        })
         
-    except Exception as e:
-        logging.error(f"Error syncing session state: {str(e)}")
-        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        logging.error("Error syncing session state: %s", e)
+        return jresp({'error': str(e)}, 400)
 
 @bp.route('/advance_session_time', methods=['POST'])
 def advance_session_time():
     """Advance session time and process background world changes"""
     try:
-        data = request.get_json()
+        from services.session_manager import session_manager
+        data = fast_json_body()
         if not data or 'session_id' not in data:
-            return jsonify({'error': 'Missing session_id parameter'}), 400
+            return jresp({'error': 'Missing session_id parameter'}, 400)
         
         session_id = data['session_id']
         time_increment = data.get('time_increment', '1 day')
@@ -279,36 +375,32 @@ def advance_session_time():
         # Advance session time
         time_result = session_manager.advance_session_time(session_id, time_increment)
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'time_advancement': time_result
-        }), 200
+        })
         
-    except Exception as e:
-        logging.error(f"Error advancing session time: {str(e)}")
-        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        logging.error("Error advancing session time: %s", e)
+        return jresp({'error': str(e)}, 400)
 
 @bp.route('/calculate_force_corruption', methods=['POST'])
 def calculate_force_corruption():
     """Calculate and track Force corruption effects"""
-    try:
-        data = request.get_json()
-        if not data or 'user' not in data:
-            return jsonify({'error': 'Missing user parameter'}), 400
-        
-        user_id = data['user']
-        
-        # Calculate corruption effects
-        corruption_result = force_engine.calculate_force_corruption(user_id)
-        
-        if 'error' in corruption_result:
-            return jsonify(corruption_result), 400
-        
-        return jsonify({
-            'status': 'success',
-            'corruption_analysis': corruption_result
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error calculating Force corruption: {str(e)}")
-        return jsonify({'error': 'Server error calculating corruption'}), 500
\ No newline at end of file
+    from services.force_morality_engine import force_engine
+    data = fast_json_body()
+    if not data or 'user' not in data:
+        return jresp({'error': 'Missing user parameter'}, 400)
+    
+    user_id = data['user']
+    
+    # Calculate corruption effects
+    corruption_result = force_engine.calculate_force_corruption(user_id)
+    
+    if 'error' in corruption_result:
+        return jresp(corruption_result, 400)
+    
+    return jresp({
+        'status': 'success',
+        'corruption_analysis': corruption_result
+    })
\ No newline at end of file
@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from sqlalchemy import and_, or_
 from flask_jwt_extended import jwt_required
 from app import db
-from models import CanvasEntry
-from services.auth_service import validate_bearer_token
-import json
+from models import CanvasEntry, parse_uuid
+from services.auth_service import request_is_authorized
+from utils.http import fast_json_body, jresp, page_params, stream_json_list
 import logging
 
 bp = Blueprint('canvas', __name__)
@@ -11,27 +12,30 @@ bp = Blueprint('canvas', __name__)
 @bp.route('/save_canvas', methods=['POST'])
 def save_canvas():
     """Save any RPG canvas type (Force HUD, Summary, etc.)"""
+    # Validate bearer token
+    if not request_is_authorized():
+        return jresp({'error': 'Unauthorized'}, 401)
+    
+    data = fast_json_body()
+    if not data:
+        return jresp({'error': 'No data provided'}, 400)
+    
     try:
-        # Validate bearer token
-        if not validate_bearer_token(request):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
         # Validate required fields
         required_fields = ['canvas', 'user', 'data', 'meta']
         for field in required_fields:
             if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+                return jresp({'error': f'Missing required field: {field}'}, 400)
         
-        # Create new canvas entry
+        # Create new canvas entry, lifting the filterable meta fields into columns
+        meta = data['meta'] if isinstance(data['meta'], dict) else {}
         canvas_entry = CanvasEntry(
             canvas=data['canvas'],
             user=data['user'],
-            data=json.dumps(data['data']),
-            meta=json.dumps(data['meta'])
+            data=data['data'],
+            meta=data['meta'],
+            campaign=meta.get('campaign'),
+            force_alignment=meta.get('force_alignment')
         )
         
         db.session.add(canvas_entry)
@@ -39,15 +43,15 @@ def save_canvas():
         
         logging.info(f"Canvas saved: {canvas_entry.id} for user {canvas_entry.user}")
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'message': 'Canvas saved successfully',
-            'id': canvas_entry.id
-        }), 200
+            'id': str(canvas_entry.id)
+        })
         
     except Exception as e:
         logging.error(f"Error saving canvas: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_canvas', methods=['GET'])
 def get_canvas():
@@ -57,16 +61,16 @@ def get_canvas():
         canvas_entry = CanvasEntry.query.order_by(CanvasEntry.timestamp.desc()).first()
         
         if not canvas_entry:
-            return jsonify({'error': 'No canvas found'}), 404
+            return jresp({'error': 'No canvas found'}, 404)
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'canvas': canvas_entry.to_dict()
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving canvas: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_canvas_by_id', methods=['GET'])
 def get_canvas_by_id():
@@ -74,20 +78,52 @@ def get_canvas_by_id():
     try:
         canvas_id = request.args.get('id')
         if not canvas_id:
-            return jsonify({'error': 'Missing id parameter'}), 400
+            return jresp({'error': 'Missing id parameter'}, 400)
         
-        canvas_entry = CanvasEntry.query.get(canvas_id)
+        entry_id = parse_uuid(canvas_id)
+        canvas_entry = db.session.get(CanvasEntry, entry_id) if entry_id else None
         if not canvas_entry:
-            return jsonify({'error': 'Canvas not found'}), 404
+            return jresp({'error': 'Canvas not found'}, 404)
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'canvas': canvas_entry.to_dict()
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving canvas by ID: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
+
+# Listing columns for ?compact=1, which skips loading and decoding the data and meta blobs
+COMPACT_COLUMNS = (CanvasEntry.id, CanvasEntry.canvas, CanvasEntry.user, CanvasEntry.timestamp)
+
+# Listing order; id breaks timestamp ties so the keyset cursor never skips or repeats a row
+NEWEST_FIRST = (CanvasEntry.timestamp.desc(), CanvasEntry.id.desc())
+
+def _older_than(cursor):
+    """Filter for rows after the cursor in NEWEST_FIRST order; ValueError on a bad before_id"""
+    if cursor is None:
+        return None
+    
+    before_ts, before_id = cursor
+    if before_id is None:
+        return CanvasEntry.timestamp < before_ts
+    
+    entry_id = parse_uuid(before_id)
+    if entry_id is None:
+        raise ValueError(f"Invalid before_id: {before_id}")
+    return or_(
+        CanvasEntry.timestamp < before_ts,
+        and_(CanvasEntry.timestamp == before_ts, CanvasEntry.id < entry_id)
+    )
+
+def _compact_entry(row):
+    return {
+        'id': str(row.id),
+        'canvas': row.canvas,
+        'user': row.user,
+        'timestamp': row.timestamp
+    }
 
 @bp.route('/get_log', methods=['GET'])
 def get_log():
@@ -96,6 +132,12 @@ def get_log():
         canvas_type = request.args.get('canvas')
         user = request.args.get('user')
         align = request.args.get('align')
+        compact = request.args.get('compact') == '1'
+        try:
+            limit, cursor = page_params()
+            cursor_filter = _older_than(cursor)
+        except ValueError:
+            return jresp({'error': 'Invalid before_ts or before_id parameter'}, 400)
         
         query = CanvasEntry.query
         
@@ -107,19 +149,29 @@ def get_log():
         
         # Apply alignment filter if provided (for Force-related canvases)
         if align:
-            # This would filter based on meta data containing alignment info
-            query = query.filter(CanvasEntry.meta.contains(f'"force_alignment":"{align}"'))
+            query = query.filter(CanvasEntry.force_alignment == align)
         
-        entries = query.order_by(CanvasEntry.timestamp.desc()).all()
+        if cursor_filter is not None:
+            query = query.filter(cursor_filter)
         
-        return jsonify({
+        serialize = CanvasEntry.to_dict
+        if compact:
+            query = query.with_entities(*COMPACT_COLUMNS)
+            serialize = _compact_entry
+        
+        entries = query.order_by(*NEWEST_FIRST).limit(limit).all()
+        last = entries[-1] if len(entries) == limit else None
+        
+        return jresp({
             'status': 'success',
-            'log': [entry.to_dict() for entry in entries]
-        }), 200
+            'log': [serialize(entry) for entry in entries],
+            'next_before_ts': last.timestamp if last else None,
+            'next_before_id': str(last.id) if last else None
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving canvas log: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_canvas_history', methods=['GET'])
 def get_canvas_history():
@@ -128,6 +180,12 @@ def get_canvas_history():
         user = request.args.get('user')
         campaign = request.args.get('campaign')
         canvas_type = request.args.get('canvas')
+        compact = request.args.get('compact') == '1'
+        try:
+            limit, cursor = page_params()
+            cursor_filter = _older_than(cursor)
+        except ValueError:
+            return jresp({'error': 'Invalid before_ts or before_id parameter'}, 400)
         
         query = CanvasEntry.query
         
@@ -135,18 +193,42 @@ def get_canvas_history():
             query = query.filter(CanvasEntry.user == user)
         
         if campaign:
-            query = query.filter(CanvasEntry.meta.contains(f'"campaign":"{campaign}"'))
+            query = query.filter(CanvasEntry.campaign == campaign)
         
         if canvas_type:
             query = query.filter(CanvasEntry.canvas == canvas_type)
         
-        entries = query.order_by(CanvasEntry.timestamp.desc()).all()
-        
-        return jsonify({
-            'status': 'success',
-            'history': [entry.to_dict() for entry in entries]
-        }), 200
+        if cursor_filter is not None:
+            query = query.filter(cursor_filter)
+        
+        serialize = CanvasEntry.to_dict
+        if compact:
+            query = query.with_entities(*COMPACT_COLUMNS)
+            serialize = _compact_entry
+        
+        # Executes the query here so errors still surface as a 500 below
+        rows = iter(query.order_by(*NEWEST_FIRST).limit(limit).yield_per(200))
+        page = {'count': 0, 'last': None}
+        
+        def entries():
+            for entry in rows:
+                page['count'] += 1
+                page['last'] = entry
+                yield serialize(entry)
+        
+        def next_cursor():
+            last = page['last'] if page['count'] == limit else None
+            return {
+                'next_before_ts': last.timestamp if last else None,
+                'next_before_id': str(last.id) if last else None
+            }
+        
+        return stream_json_list(
+            'history', entries(),
+            head={'status': 'success'},
+            tail=next_cursor
+        )
         
     except Exception as e:
         logging.error(f"Error retrieving canvas history: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
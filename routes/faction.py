@@ -1,53 +1,83 @@
-from flask import Blueprint, request, jsonify
+from bisect import bisect_right
+from flask import Blueprint, request
+from sqlalchemy import case, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
 from app import db
 from models import FactionState
 from services.galaxy_service import update_faction_ai, calculate_faction_response
-import json
+from utils.http import fast_json_body, jresp, json_conditional_response, page_params
+from datetime import datetime
 import logging
 
 bp = Blueprint('faction', __name__)
 
+# Lower bound of each band after the first; a value on an edge falls into the higher band
+REPUTATION_EDGES = (-50, -10, 10, 50)
+REPUTATION_LABELS = ('Hostile', 'Unfriendly', 'Neutral', 'Friendly', 'Allied')
+AWARENESS_EDGES = (30, 70)
+AWARENESS_LABELS = ('Low', 'Medium', 'High')
+
+def _build_relationships(factions):
+    """Relationship matrix keyed by faction name"""
+    relationships = {}
+    for faction in factions:
+        relationships[faction.faction_name] = {
+            'reputation': faction.reputation,
+            'awareness': faction.awareness,
+            'threat_level': AWARENESS_LABELS[bisect_right(AWARENESS_EDGES, faction.awareness)],
+            'relationship_status': REPUTATION_LABELS[bisect_right(REPUTATION_EDGES, faction.reputation)]
+        }
+    return relationships
+
 @bp.route('/faction_tick', methods=['POST'])
 def faction_tick():
     """Real-time, persistent faction simulation"""
+    data = fast_json_body()
     try:
-        data = request.get_json()
         user = data.get('user', 'anonymous')
         action = data.get('action', 'passive_tick')
         target_faction = data.get('faction')
         
         # Get all factions for this user (or system factions)
         factions = FactionState.query.filter(
-            (FactionState.user == user) | (FactionState.user == 'system')
+            FactionState.user.in_([user, 'system'])
         ).all()
         
         faction_updates = []
+        # Every faction touched by this tick shares one interaction time
+        tick_time = datetime.utcnow()
         
         for faction in factions:
             # Calculate faction AI response based on player actions
             old_state = faction.to_dict()
             
             # Update faction based on action and current state
-            updated_faction = update_faction_ai(faction, action, target_faction)
+            updated_faction = update_faction_ai(faction, action, target_faction, now=tick_time)
             
             if updated_faction:
-                db.session.commit()
+                new_state = updated_faction.to_dict()
                 faction_updates.append({
                     'faction': updated_faction.faction_name,
                     'old_state': old_state,
-                    'new_state': updated_faction.to_dict(),
-                    'changes': calculate_faction_response(old_state, updated_faction.to_dict())
+                    'new_state': new_state,
+                    'changes': calculate_faction_response(old_state, new_state)
                 })
         
-        return jsonify({
+        # One transaction covers every faction touched by this tick; the flush
+        # batches row updates that touch the same columns into one executemany
+        db.session.commit()
+        
+        return jresp({
             'status': 'success',
             'faction_updates': faction_updates,
             'galaxy_momentum': sum(f['new_state']['awareness'] for f in faction_updates)
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error in faction tick: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_faction_state', methods=['GET'])
 def get_faction_state():
@@ -57,80 +87,91 @@ def get_faction_state():
         faction_name = request.args.get('faction')
         
         query = FactionState.query.filter(
-            (FactionState.user == user) | (FactionState.user == 'system')
+            FactionState.user.in_([user, 'system'])
         )
         
         if faction_name:
             query = query.filter(FactionState.faction_name == faction_name)
         
-        factions = query.all()
+        limit, _ = page_params()
+        factions = query.order_by(FactionState.faction_name).limit(limit).all()
         
-        return jsonify({
+        return json_conditional_response({
             'status': 'success',
             'factions': [faction.to_dict() for faction in factions]
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving faction state: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
+
+def _clamp(value, low, high):
+    return case((value < low, low), (value > high, high), else_=value)
+
+def _reputation_upsert(faction_name, user, reputation_change, awareness_change):
+    """INSERT ... SELECT from the system row, ON CONFLICT shifting the user's row"""
+    insert = pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    now = datetime.utcnow()
+    system = FactionState.__table__.alias('system_faction')
+    
+    seed = select(
+        literal(faction_name),
+        literal(user),
+        literal(max(-100, min(100, reputation_change))),
+        literal(max(0, min(100, awareness_change))),
+        system.c.resources,
+        system.c.goals,
+        system.c.active_operations,
+        literal(now)
+    ).where(system.c.faction_name == faction_name, system.c.user == 'system')
+    
+    stmt = insert(FactionState).from_select(
+        ['faction_name', 'user', 'reputation', 'awareness', 'resources', 'goals', 'active_operations', 'last_interaction'],
+        seed
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['faction_name', 'user'],
+        set_={
+            'reputation': _clamp(FactionState.reputation + reputation_change, -100, 100),
+            'awareness': _clamp(FactionState.awareness + awareness_change, 0, 100),
+            'last_interaction': now
+        }
+    ).returning(FactionState)
 
 @bp.route('/update_faction_reputation', methods=['POST'])
 def update_faction_reputation():
     """Update reputation with a specific faction"""
+    data = fast_json_body()
     try:
-        data = request.get_json()
         user = data.get('user')
         faction_name = data.get('faction_name')
         reputation_change = data.get('reputation_change', 0)
         awareness_change = data.get('awareness_change', 0)
         
         if not user or not faction_name:
-            return jsonify({'error': 'Missing required fields'}), 400
+            return jresp({'error': 'Missing required fields'}, 400)
         
-        # Find or create faction state for user
-        faction = FactionState.query.filter_by(
-            faction_name=faction_name,
-            user=user
-        ).first()
+        # Seed a missing user row from the system defaults, or shift the existing
+        # one, in a single upsert; the system row must exist for either case
+        faction = db.session.execute(
+            _reputation_upsert(faction_name, user, int(reputation_change), int(awareness_change)),
+            execution_options={'populate_existing': True}
+        ).scalar_one_or_none()
         
         if not faction:
-            # Create new faction state based on system defaults
-            system_faction = FactionState.query.filter_by(
-                faction_name=faction_name,
-                user='system'
-            ).first()
-            
-            if system_faction:
-                faction = FactionState(
-                    faction_name=faction_name,
-                    user=user,
-                    reputation=reputation_change,
-                    awareness=awareness_change,
-                    resources=system_faction.resources,
-                    goals=system_faction.goals,
-                    active_operations=system_faction.active_operations
-                )
-                db.session.add(faction)
-            else:
-                return jsonify({'error': 'Unknown faction'}), 404
-        else:
-            faction.reputation += reputation_change
-            faction.awareness += awareness_change
-        
-        # Clamp values to reasonable ranges
-        faction.reputation = max(-100, min(100, faction.reputation))
-        faction.awareness = max(0, min(100, faction.awareness))
+            db.session.rollback()
+            return jresp({'error': 'Unknown faction'}, 404)
         
         db.session.commit()
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'faction': faction.to_dict()
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error updating faction reputation: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_faction_relationships', methods=['GET'])
 def get_faction_relationships():
@@ -139,27 +180,16 @@ def get_faction_relationships():
         user = request.args.get('user', 'anonymous')
         
         factions = FactionState.query.filter(
-            (FactionState.user == user) | (FactionState.user == 'system')
+            FactionState.user.in_([user, 'system'])
+        ).options(
+            load_only(FactionState.faction_name, FactionState.reputation, FactionState.awareness)
         ).all()
         
-        # Create relationship matrix
-        relationships = {}
-        for faction in factions:
-            relationships[faction.faction_name] = {
-                'reputation': faction.reputation,
-                'awareness': faction.awareness,
-                'threat_level': 'Low' if faction.awareness < 30 else 'Medium' if faction.awareness < 70 else 'High',
-                'relationship_status': 'Hostile' if faction.reputation < -50 else 
-                                    'Unfriendly' if faction.reputation < -10 else
-                                    'Neutral' if faction.reputation < 10 else
-                                    'Friendly' if faction.reputation < 50 else 'Allied'
-            }
-        
-        return jsonify({
+        return json_conditional_response({
             'status': 'success',
-            'relationships': relationships
-        }), 200
+            'relationships': _build_relationships(factions)
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving faction relationships: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
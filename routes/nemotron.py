@@ -1,18 +1,38 @@
-from flask import Blueprint, request, jsonify, Response
-from services.nvidia_service import query_nemotron_api
+from flask import Blueprint, request, Response, stream_with_context
+from services.nvidia_service import cached_nemotron, query_nemotron_batch as nemotron_batch, stream_nemotron_tokens
+from services import npc_log_writer
 from app import db
-import json
+from utils.http import fast_json_body, jresp, stream_json_list
 import logging
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import func
 
 bp = Blueprint('nemotron', __name__)
 
+MAX_BATCH_QUERIES = 16
+
+def _npc_system_message(npc_name, npc_type, npc_context):
+    """System prompt for immersive, in-character Star Wars NPC dialogue"""
+    return f"""You are {npc_name}, a {npc_type} in the Star Wars galaxy. 
+        Respond in character, maintaining immersive, lore-accurate dialogue. 
+        Keep responses concise but engaging. Never break character or mention real-world concepts.
+        
+        Context: {npc_context}
+        
+        Guidelines:
+        - Use appropriate Star Wars terminology and references
+        - Maintain the character's personality and background
+        - Respond naturally to the player's input
+        - Keep responses between 1-3 sentences unless a longer response is clearly needed"""
+
 @bp.route('/query_nemotron', methods=['POST'])
 def query_nemotron():
     """Generate immersive, lore-accurate NPC dialogue"""
+    data = fast_json_body()
     try:
-        data = request.get_json()
         if not data or 'message' not in data:
-            return jsonify({'error': 'Missing message field'}), 400
+            return jresp({'error': 'Missing message field'}, 400)
         
         user_message = data['message']
         
@@ -22,52 +42,125 @@ def query_nemotron():
         npc_type = data.get('npc_type', 'civilian')
         
         # Prepare the system message for immersive Star Wars dialogue
-        system_message = f"""You are {npc_name}, a {npc_type} in the Star Wars galaxy. 
-        Respond in character, maintaining immersive, lore-accurate dialogue. 
-        Keep responses concise but engaging. Never break character or mention real-world concepts.
-        
-        Context: {npc_context}
-        
-        Guidelines:
-        - Use appropriate Star Wars terminology and references
-        - Maintain the character's personality and background
-        - Respond naturally to the player's input
-        - Keep responses between 1-3 sentences unless a longer response is clearly needed"""
+        system_message = _npc_system_message(npc_name, npc_type, npc_context)
         
-        # Query NVIDIA Nemotron API
-        response_data = query_nemotron_api(system_message, user_message)
+        # Query NVIDIA Nemotron API, reusing responses for repeated prompts
+        response_data = cached_nemotron(system_message, user_message)
         
         if not response_data:
-            return jsonify({'error': 'Failed to get response from Nemotron'}), 500
+            return jresp({'error': 'Failed to get response from Nemotron'}, 500)
         
         # Extract the NPC response
         npc_response = ""
         if 'choices' in response_data and len(response_data['choices']) > 0:
             npc_response = response_data['choices'][0]['message']['content']
         
-        # Log the interaction for persistence
-        try:
-            from models import NPCInteraction
-            interaction = NPCInteraction(
+        # Log the interaction for persistence without holding up the reply
+        npc_log_writer.log_interaction(
+            user=data.get('user', 'anonymous'),
+            npc_name=npc_name,
+            npc_type=npc_type,
+            interaction_context=npc_context,
+            player_message=user_message,
+            npc_response=npc_response,
+            sentiment=data.get('sentiment', 'neutral'),
+            memory_tier=data.get('memory_tier', 1)
+        )
+        
+        return jresp(response_data)
+        
+    except Exception as e:
+        logging.error(f"Error in nemotron query: {str(e)}")
+        return jresp({'error': 'Server error'}, 500)
+
+@bp.route('/query_nemotron_stream', methods=['POST'])
+def query_nemotron_stream():
+    """Stream NPC dialogue as plain text while Nemotron generates it"""
+    data = fast_json_body()
+    try:
+        if not data or 'message' not in data:
+            return jresp({'error': 'Missing message field'}, 400)
+        
+        user_message = data['message']
+        npc_context = data.get('npc_context', 'You are a helpful NPC in the Star Wars universe.')
+        npc_name = data.get('npc_name', 'Unknown NPC')
+        npc_type = data.get('npc_type', 'civilian')
+        system_message = _npc_system_message(npc_name, npc_type, npc_context)
+        
+        def generate():
+            parts = []
+            for token in stream_nemotron_tokens(system_message, user_message):
+                parts.append(token)
+                yield token.encode('utf-8')
+            
+            # Log the full reply once the stream has finished
+            npc_log_writer.log_interaction(
                 user=data.get('user', 'anonymous'),
                 npc_name=npc_name,
                 npc_type=npc_type,
                 interaction_context=npc_context,
                 player_message=user_message,
-                npc_response=npc_response,
+                npc_response=''.join(parts),
                 sentiment=data.get('sentiment', 'neutral'),
                 memory_tier=data.get('memory_tier', 1)
             )
-            db.session.add(interaction)
-            db.session.commit()
-        except Exception as e:
-            logging.warning(f"Failed to log NPC interaction: {str(e)}")
         
-        return jsonify(response_data), 200
+        return Response(stream_with_context(generate()), mimetype='text/plain')
         
     except Exception as e:
-        logging.error(f"Error in nemotron query: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        logging.error(f"Error in nemotron stream: {str(e)}")
+        return jresp({'error': 'Server error'}, 500)
+
+@bp.route('/query_nemotron_batch', methods=['POST'])
+def query_nemotron_batch():
+    """Generate dialogue for several NPCs in a scene with the API calls in flight together"""
+    data = fast_json_body()
+    try:
+        queries = data.get('queries') if data else None
+        
+        if not isinstance(queries, list) or not queries:
+            return jresp({'error': 'Missing queries list'}, 400)
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jresp({'error': f'At most {MAX_BATCH_QUERIES} queries per call'}, 400)
+        if not all(isinstance(query, dict) and 'message' in query for query in queries):
+            return jresp({'error': 'Every query needs a message field'}, 400)
+        
+        for query in queries:
+            query.setdefault('npc_context', 'You are a helpful NPC in the Star Wars universe.')
+            query.setdefault('npc_name', 'Unknown NPC')
+            query.setdefault('npc_type', 'civilian')
+        
+        responses = nemotron_batch([
+            (_npc_system_message(query['npc_name'], query['npc_type'], query['npc_context']), query['message'])
+            for query in queries
+        ])
+        
+        results = []
+        for query, response_data in zip(queries, responses):
+            npc_response = ""
+            if response_data and response_data.get('choices'):
+                npc_response = response_data['choices'][0]['message']['content']
+            
+            npc_log_writer.log_interaction(
+                user=query.get('user', data.get('user', 'anonymous')),
+                npc_name=query['npc_name'],
+                npc_type=query['npc_type'],
+                interaction_context=query['npc_context'],
+                player_message=query['message'],
+                npc_response=npc_response,
+                sentiment=query.get('sentiment', 'neutral'),
+                memory_tier=query.get('memory_tier', 1)
+            )
+            results.append({'npc_name': query['npc_name'], 'response': npc_response})
+        
+        return jresp({
+            'status': 'success',
+            'responses': results
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in nemotron batch query: {str(e)}")
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_npc_history', methods=['GET'])
 def get_npc_history():
@@ -77,22 +170,23 @@ def get_npc_history():
         npc_name = request.args.get('npc_name')
         
         if not user or not npc_name:
-            return jsonify({'error': 'Missing user or npc_name parameter'}), 400
+            return jresp({'error': 'Missing user or npc_name parameter'}, 400)
         
         from models import NPCInteraction
-        interactions = NPCInteraction.query.filter_by(
+        interactions = iter(NPCInteraction.query.filter_by(
             user=user,
             npc_name=npc_name
-        ).order_by(NPCInteraction.timestamp.desc()).limit(50).all()
+        ).order_by(NPCInteraction.timestamp.desc()).limit(50).yield_per(50))
         
-        return jsonify({
-            'status': 'success',
-            'history': [interaction.to_dict() for interaction in interactions]
-        }), 200
+        return stream_json_list(
+            'history',
+            (interaction.to_dict() for interaction in interactions),
+            head={'status': 'success'}
+        )
         
     except Exception as e:
         logging.error(f"Error retrieving NPC history: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
 
 @bp.route('/get_all_npc_interactions', methods=['GET'])
 def get_all_npc_interactions():
@@ -101,23 +195,32 @@ def get_all_npc_interactions():
         user = request.args.get('user')
         
         if not user:
-            return jsonify({'error': 'Missing user parameter'}), 400
+            return jresp({'error': 'Missing user parameter'}, 400)
+        
+        from models import NPCInteraction
+        per_npc = max(1, min(request.args.get('per_npc', 10, type=int), 50))
+        
+        # Latest interactions per NPC, ranked in SQL and returned clustered by NPC
+        rank = func.row_number().over(
+            partition_by=NPCInteraction.npc_name,
+            order_by=NPCInteraction.timestamp.desc()
+        ).label('rank')
+        ranked = db.session.query(NPCInteraction.id, rank).filter(NPCInteraction.user == user).subquery()
         
-        interactions = NPCInteraction.query.filter_by(user=user)\
-            .order_by(NPCInteraction.timestamp.desc()).limit(100).all()
+        interactions = NPCInteraction.query.join(ranked, ranked.c.id == NPCInteraction.id)\
+            .filter(ranked.c.rank <= per_npc)\
+            .order_by(NPCInteraction.npc_name, NPCInteraction.timestamp.desc())
         
-        # Group by NPC for better organization
-        npc_groups = {}
-        for interaction in interactions:
-            if interaction.npc_name not in npc_groups:
-                npc_groups[interaction.npc_name] = []
-            npc_groups[interaction.npc_name].append(interaction.to_dict())
+        npc_groups = {
+            npc_name: [interaction.to_dict() for interaction in group]
+            for npc_name, group in groupby(interactions, key=attrgetter('npc_name'))
+        }
         
-        return jsonify({
+        return jresp({
             'status': 'success',
             'interactions': npc_groups
-        }), 200
+        })
         
     except Exception as e:
         logging.error(f"Error retrieving all NPC interactions: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+        return jresp({'error': 'Server error'}, 500)
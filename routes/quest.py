@@ -1,174 +1,213 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from sqlalchemy import func, insert
+from sqlalchemy.orm import load_only
 from app import db
-from models import QuestLog, FactionState
+from models import QuestLog, FactionState, parse_uuid
 from services.galaxy_service import generate_procedural_quest
-import json
-import logging
+from utils.http import fast_json_body, jresp
 from datetime import datetime
 
 bp = Blueprint('quest', __name__)
 
+HISTORY_STATUSES = ('active', 'completed', 'failed', 'abandoned')
+MAX_BULK_QUESTS = 100
+
 @bp.route('/generate_quest', methods=['POST'])
 def generate_quest():
     """Procedural quest logic based on state + morality"""
-    try:
-        data = request.get_json()
-        user = data.get('user')
-        
-        if not user:
-            return jsonify({'error': 'Missing user field'}), 400
-        
-        # Get current faction states to influence quest generation
-        faction_states = FactionState.query.filter(
-            (FactionState.user == user) | (FactionState.user == 'system')
-        ).all()
-        
-        # Generate quest based on current game state
-        quest_data = generate_procedural_quest(user, faction_states, data)
-        
-        # Create quest log entry
-        quest = QuestLog(
-            user=user,
-            quest_title=quest_data['title'],
-            quest_type=quest_data['type'],
-            description=quest_data['description'],
-            objectives=json.dumps(quest_data['objectives']),
-            rewards=json.dumps(quest_data['rewards']),
-            difficulty=quest_data['difficulty'],
-            faction_involvement=json.dumps(quest_data['faction_involvement'])
-        )
-        
-        db.session.add(quest)
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'quest': quest.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error generating quest: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    data = fast_json_body()
+    user = data.get('user')
+    
+    if not user:
+        return jresp({'error': 'Missing user field'}, 400)
+    
+    # Get current faction states to influence quest generation
+    # The generator only reads these columns; skip the JSON blobs
+    faction_states = FactionState.query.filter(
+        FactionState.user.in_([user, 'system'])
+    ).options(
+        load_only(FactionState.faction_name, FactionState.reputation, FactionState.awareness)
+    ).all()
+    
+    # Generate quest based on current game state
+    quest_data = generate_procedural_quest(user, faction_states, data)
+    
+    # Create quest log entry
+    quest = QuestLog(
+        user=user,
+        quest_title=quest_data['title'],
+        quest_type=quest_data['type'],
+        description=quest_data['description'],
+        objectives=quest_data['objectives'],
+        rewards=quest_data['rewards'],
+        difficulty=quest_data['difficulty'],
+        faction_involvement=quest_data['faction_involvement']
+    )
+    
+    db.session.add(quest)
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'quest': quest.to_dict()
+    })
+
+@bp.route('/generate_quests_bulk', methods=['POST'])
+def generate_quests_bulk():
+    """Generate quests for many users in one transaction"""
+    data = fast_json_body()
+    quest_requests = data.get('requests') if data else None
+    
+    if not isinstance(quest_requests, list) or not quest_requests:
+        return jresp({'error': 'Missing requests list'}, 400)
+    if len(quest_requests) > MAX_BULK_QUESTS:
+        return jresp({'error': f'At most {MAX_BULK_QUESTS} requests per call'}, 400)
+    if not all(isinstance(item, dict) and item.get('user') for item in quest_requests):
+        return jresp({'error': 'Every request needs a user field'}, 400)
+    
+    # One faction query covers every requested user plus the system factions
+    users = {item['user'] for item in quest_requests}
+    faction_rows = FactionState.query.filter(
+        FactionState.user.in_(users | {'system'})
+    ).options(
+        load_only(FactionState.user, FactionState.faction_name, FactionState.reputation, FactionState.awareness)
+    ).all()
+    system_factions = [f for f in faction_rows if f.user == 'system']
+    factions_by_user = {user: list(system_factions) for user in users}
+    for faction in faction_rows:
+        # System rows are already in every list, including a request for user 'system'
+        if faction.user != 'system':
+            factions_by_user[faction.user].append(faction)
+    
+    rows = []
+    for item in quest_requests:
+        quest_data = generate_procedural_quest(item['user'], factions_by_user[item['user']], item)
+        rows.append({
+            'user': item['user'],
+            'quest_title': quest_data['title'],
+            'quest_type': quest_data['type'],
+            'description': quest_data['description'],
+            'objectives': quest_data['objectives'],
+            'rewards': quest_data['rewards'],
+            'difficulty': quest_data['difficulty'],
+            'faction_involvement': quest_data['faction_involvement']
+        })
+    
+    # A single executemany INSERT ... RETURNING and one commit for the whole batch
+    quests = db.session.scalars(insert(QuestLog).returning(QuestLog, sort_by_parameter_order=True), rows).all()
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'quests': [quest.to_dict() for quest in quests]
+    })
 
 @bp.route('/get_active_quests', methods=['GET'])
 def get_active_quests():
     """Get all active quests for a user"""
-    try:
-        user = request.args.get('user')
-        
-        if not user:
-            return jsonify({'error': 'Missing user parameter'}), 400
-        
-        quests = QuestLog.query.filter_by(
-            user=user,
-            status='active'
-        ).order_by(QuestLog.created_at.desc()).all()
-        
-        return jsonify({
-            'status': 'success',
-            'quests': [quest.to_dict() for quest in quests]
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error retrieving active quests: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    user = request.args.get('user')
+    
+    if not user:
+        return jresp({'error': 'Missing user parameter'}, 400)
+    
+    quests = QuestLog.query.filter_by(
+        user=user,
+        status='active'
+    ).order_by(QuestLog.created_at.desc()).all()
+    
+    return jresp({
+        'status': 'success',
+        'quests': [quest.to_dict() for quest in quests]
+    })
 
 @bp.route('/update_quest_status', methods=['POST'])
 def update_quest_status():
     """Update quest progress or completion status"""
-    try:
-        data = request.get_json()
-        quest_id = data.get('quest_id')
-        new_status = data.get('status')
-        
-        if not quest_id or not new_status:
-            return jsonify({'error': 'Missing quest_id or status'}), 400
-        
-        quest = QuestLog.query.get(quest_id)
-        if not quest:
-            return jsonify({'error': 'Quest not found'}), 404
-        
-        quest.status = new_status
-        
-        if new_status == 'completed':
-            from datetime import datetime
-            quest.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'quest': quest.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error updating quest status: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    data = fast_json_body()
+    quest_id = data.get('quest_id')
+    new_status = data.get('status')
+    
+    if not quest_id or not new_status:
+        return jresp({'error': 'Missing quest_id or status'}, 400)
+    
+    quest_uuid = parse_uuid(quest_id)
+    quest = db.session.get(QuestLog, quest_uuid) if quest_uuid else None
+    if not quest:
+        return jresp({'error': 'Quest not found'}, 404)
+    
+    quest.status = new_status
+    
+    if new_status == 'completed':
+        quest.completed_at = datetime.utcnow()
+    
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'quest': quest.to_dict()
+    })
 
 @bp.route('/get_quest_history', methods=['GET'])
 def get_quest_history():
     """Get quest completion history"""
-    try:
-        user = request.args.get('user')
-        
-        if not user:
-            return jsonify({'error': 'Missing user parameter'}), 400
-        
-        quests = QuestLog.query.filter_by(user=user)\
-            .order_by(QuestLog.created_at.desc()).all()
-        
-        # Organize by status
-        quest_history = {
-            'active': [],
-            'completed': [],
-            'failed': [],
-            'abandoned': []
-        }
-        
-        for quest in quests:
-            if quest.status in quest_history:
-                quest_history[quest.status].append(quest.to_dict())
-        
-        return jsonify({
-            'status': 'success',
-            'history': quest_history
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error retrieving quest history: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    user = request.args.get('user')
+    
+    if not user:
+        return jresp({'error': 'Missing user parameter'}, 400)
+    
+    per_status = max(1, min(request.args.get('per_status', 100, type=int), 500))
+    
+    # Organize by status
+    quest_history = {status: [] for status in HISTORY_STATUSES}
+    
+    # Latest quests per status, ranked in SQL so only the capped rows are fetched
+    rank = func.row_number().over(
+        partition_by=QuestLog.status,
+        order_by=QuestLog.created_at.desc()
+    ).label('rank')
+    ranked = db.session.query(QuestLog.id, rank).filter(
+        QuestLog.user == user,
+        QuestLog.status.in_(HISTORY_STATUSES)
+    ).subquery()
+    
+    quests = QuestLog.query.join(ranked, ranked.c.id == QuestLog.id)\
+        .filter(ranked.c.rank <= per_status)\
+        .order_by(QuestLog.status, QuestLog.created_at.desc())
+    
+    for quest in quests:
+        quest_history[quest.status].append(quest.to_dict())
+    
+    return jresp({
+        'status': 'success',
+        'history': quest_history
+    })
 
 @bp.route('/add_quest_objective', methods=['POST'])
 def add_quest_objective():
     """Add a new objective to an existing quest"""
-    try:
-        data = request.get_json()
-        quest_id = data.get('quest_id')
-        objective = data.get('objective')
-        
-        if not quest_id or not objective:
-            return jsonify({'error': 'Missing quest_id or objective'}), 400
-        
-        quest = QuestLog.query.get(quest_id)
-        if not quest:
-            return jsonify({'error': 'Quest not found'}), 404
-        
-        objectives = json.loads(quest.objectives) if quest.objectives else []
-        from datetime import datetime
-        objectives.append({
-            'description': objective,
-            'completed': False,
-            'added_at': datetime.utcnow().isoformat() + 'Z'
-        })
-        
-        quest.objectives = json.dumps(objectives)
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'quest': quest.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error adding quest objective: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    data = fast_json_body()
+    quest_id = data.get('quest_id')
+    objective = data.get('objective')
+    
+    if not quest_id or not objective:
+        return jresp({'error': 'Missing quest_id or objective'}, 400)
+    
+    quest_uuid = parse_uuid(quest_id)
+    quest = db.session.get(QuestLog, quest_uuid) if quest_uuid else None
+    if not quest:
+        return jresp({'error': 'Quest not found'}, 404)
+    
+    objectives = list(quest.objectives or [])
+    objectives.append({
+        'description': objective,
+        'completed': False,
+        'added_at': datetime.utcnow().isoformat() + 'Z'
+    })
+    
+    quest.objectives = objectives
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'quest': quest.to_dict()
+    })
@@ -1,190 +1,193 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from sqlalchemy import cast, func, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import selectinload
 from app import db
 from models import SessionState
-import json
-import logging
-from datetime import datetime
+from services import session_users
+from utils.http import fast_json_body, jresp
+from datetime import datetime, timedelta
 
 bp = Blueprint('session', __name__)
 
+# Reads only bump last_active once it is this stale, so polling clients don't write on every GET
+LAST_ACTIVE_DEBOUNCE = timedelta(seconds=30)
+
 @bp.route('/get_session_state', methods=['GET'])
 def get_session_state():
     """Get current session state"""
-    try:
-        session_id = request.args.get('session_id')
-        
-        if not session_id:
-            return jsonify({'error': 'Missing session_id parameter'}), 400
-        
-        session = SessionState.query.filter_by(session_id=session_id).first()
-        
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        # Update last active timestamp
-        session.last_active = datetime.utcnow()
+    session_id = request.args.get('session_id')
+    
+    if not session_id:
+        return jresp({'error': 'Missing session_id parameter'}, 400)
+    
+    session = SessionState.query.filter_by(session_id=session_id).options(selectinload(SessionState.members)).first()
+    
+    if not session:
+        return jresp({'error': 'Session not found'}, 404)
+    
+    # Update last active timestamp
+    now = datetime.utcnow()
+    if not session.last_active or now - session.last_active > LAST_ACTIVE_DEBOUNCE:
+        session.last_active = now
         db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session': session.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error retrieving session state: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    
+    return jresp({
+        'status': 'success',
+        'session': session.to_dict()
+    })
+
+def _merge_session_state(session, data):
+    """Apply an update payload to a loaded session in Python"""
+    if 'users' in data:
+        session.users = data['users']
+    if 'current_location' in data:
+        session.current_location = data['current_location']
+    if 'active_scene' in data:
+        session.active_scene = data['active_scene']
+    if 'session_data' in data:
+        # Merge session data
+        existing_data = dict(session.session_data or {})
+        existing_data.update(data['session_data'])
+        session.session_data = existing_data
+    if 'galaxy_momentum' in data:
+        session.galaxy_momentum = data['galaxy_momentum']
+    if 'force_events' in data:
+        existing_events = list(session.force_events or [])
+        existing_events.extend(data['force_events'])
+        session.force_events = existing_events
+    session.last_active = datetime.utcnow()
+
+def _merge_session_state_pg(session_id, data):
+    """Apply an update payload in one UPDATE ... RETURNING; None if the session does not exist"""
+    values = {'last_active': datetime.utcnow()}
+    for field in ('current_location', 'active_scene', 'galaxy_momentum'):
+        if field in data:
+            values[field] = data[field]
+    if 'session_data' in data:
+        values['session_data'] = func.coalesce(SessionState.session_data, cast({}, JSONB))\
+            .op('||', return_type=JSONB)(cast(data['session_data'], JSONB))
+    if 'force_events' in data:
+        values['force_events'] = func.coalesce(SessionState.force_events, cast([], JSONB))\
+            .op('||', return_type=JSONB)(cast(data['force_events'], JSONB))
+    
+    stmt = update(SessionState).where(SessionState.session_id == session_id)\
+        .values(**values).returning(SessionState).options(selectinload(SessionState.members))
+    return db.session.execute(
+        stmt, execution_options={'synchronize_session': False, 'populate_existing': True}
+    ).scalar_one_or_none()
 
 @bp.route('/update_session_state', methods=['POST'])
 def update_session_state():
     """Update session state data"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            return jsonify({'error': 'Missing session_id'}), 400
-        
-        session = SessionState.query.filter_by(session_id=session_id).first()
-        
-        if not session:
-            # Create new session
-            session = SessionState(
-                session_id=session_id,
-                users=json.dumps(data.get('users', [])),
-                current_location=data.get('current_location'),
-                active_scene=data.get('active_scene'),
-                session_data=json.dumps(data.get('session_data', {})),
-                galaxy_momentum=data.get('galaxy_momentum', 0),
-                force_events=json.dumps(data.get('force_events', []))
-            )
-            db.session.add(session)
-        else:
-            # Update existing session
-            if 'users' in data:
-                session.users = json.dumps(data['users'])
-            if 'current_location' in data:
-                session.current_location = data['current_location']
-            if 'active_scene' in data:
-                session.active_scene = data['active_scene']
-            if 'session_data' in data:
-                # Merge session data
-                existing_data = json.loads(session.session_data) if session.session_data else {}
-                existing_data.update(data['session_data'])
-                session.session_data = json.dumps(existing_data)
-            if 'galaxy_momentum' in data:
-                session.galaxy_momentum = data['galaxy_momentum']
-            if 'force_events' in data:
-                existing_events = json.loads(session.force_events) if session.force_events else []
-                existing_events.extend(data['force_events'])
-                session.force_events = json.dumps(existing_events)
-        
-        session.last_active = datetime.utcnow()
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session': session.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error updating session state: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
-
-@bp.route('/create_session', methods=['POST'])
-def create_session():
-    """Create a new multiplayer session"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            return jsonify({'error': 'Missing session_id'}), 400
-        
-        # Check if session already exists
-        existing_session = SessionState.query.filter_by(session_id=session_id).first()
-        if existing_session:
-            return jsonify({'error': 'Session already exists'}), 400
-        
+    data = fast_json_body()
+    session_id = data.get('session_id')
+    
+    if not session_id:
+        return jresp({'error': 'Missing session_id'}, 400)
+    
+    if db.engine.dialect.name == 'postgresql':
+        # Merge server-side with jsonb || so the stored blobs never round-trip
+        session = _merge_session_state_pg(session_id, data)
+        if session and 'users' in data:
+            session.users = data['users']
+    else:
+        session = SessionState.query.filter_by(session_id=session_id).options(selectinload(SessionState.members)).first()
+        if session:
+            _merge_session_state(session, data)
+    
+    if not session:
+        # Create new session
         session = SessionState(
             session_id=session_id,
-            users=json.dumps(data.get('users', [])),
-            current_location=data.get('current_location', 'Unknown'),
-            active_scene=data.get('active_scene', 'Starting Scene'),
-            session_data=json.dumps(data.get('session_data', {})),
-            galaxy_momentum=0,
-            force_events=json.dumps([])
+            users=data.get('users', []),
+            current_location=data.get('current_location'),
+            active_scene=data.get('active_scene'),
+            session_data=data.get('session_data', {}),
+            galaxy_momentum=data.get('galaxy_momentum', 0),
+            force_events=data.get('force_events', [])
         )
-        
         db.session.add(session)
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session': session.to_dict()
-        }), 201
-        
-    except Exception as e:
-        logging.error(f"Error creating session: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'session': session.to_dict()
+    })
+
+@bp.route('/create_session', methods=['POST'])
+def create_session():
+    """Create a new multiplayer session"""
+    data = fast_json_body()
+    session_id = data.get('session_id')
+    
+    if not session_id:
+        return jresp({'error': 'Missing session_id'}, 400)
+    
+    # Check if session already exists
+    existing_session = SessionState.query.filter_by(session_id=session_id).first()
+    if existing_session:
+        return jresp({'error': 'Session already exists'}, 400)
+    
+    session = SessionState(
+        session_id=session_id,
+        users=data.get('users', []),
+        current_location=data.get('current_location', 'Unknown'),
+        active_scene=data.get('active_scene', 'Starting Scene'),
+        session_data=data.get('session_data', {}),
+        galaxy_momentum=0,
+        force_events=[]
+    )
+    
+    db.session.add(session)
+    db.session.commit()
+    
+    return jresp({
+        'status': 'success',
+        'session': session.to_dict()
+    }, 201)
 
 @bp.route('/join_session', methods=['POST'])
 def join_session():
     """Add a user to an existing session"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        user = data.get('user')
-        
-        if not session_id or not user:
-            return jsonify({'error': 'Missing session_id or user'}), 400
-        
-        session = SessionState.query.filter_by(session_id=session_id).first()
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        users = json.loads(session.users) if session.users else []
-        if user not in users:
-            users.append(user)
-            session.users = json.dumps(users)
-            session.last_active = datetime.utcnow()
-            db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session': session.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error joining session: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    data = fast_json_body()
+    session_id = data.get('session_id')
+    user = data.get('user')
+    
+    if not session_id or not user:
+        return jresp({'error': 'Missing session_id or user'}, 400)
+    
+    session = SessionState.query.filter_by(session_id=session_id).options(selectinload(SessionState.members)).first()
+    if session and session_users.add_user(session, user):
+        db.session.commit()
+    
+    if not session:
+        return jresp({'error': 'Session not found'}, 404)
+    
+    return jresp({
+        'status': 'success',
+        'session': session.to_dict()
+    })
 
 @bp.route('/leave_session', methods=['POST'])
 def leave_session():
     """Remove a user from a session"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        user = data.get('user')
-        
-        if not session_id or not user:
-            return jsonify({'error': 'Missing session_id or user'}), 400
-        
-        session = SessionState.query.filter_by(session_id=session_id).first()
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        users = json.loads(session.users) if session.users else []
-        if user in users:
-            users.remove(user)
-            session.users = json.dumps(users)
-            session.last_active = datetime.utcnow()
-            db.session.commit()
-        
-        return jsonify({
-            'status': 'success',
-            'session': session.to_dict()
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error leaving session: {str(e)}")
-        return jsonify({'error': 'Server error'}), 500
+    data = fast_json_body()
+    session_id = data.get('session_id')
+    user = data.get('user')
+    
+    if not session_id or not user:
+        return jresp({'error': 'Missing session_id or user'}, 400)
+    
+    session = SessionState.query.filter_by(session_id=session_id).options(selectinload(SessionState.members)).first()
+    if session and session_users.remove_user(session, user):
+        db.session.commit()
+    
+    if not session:
+        return jresp({'error': 'Session not found'}, 404)
+    
+    return jresp({
+        'status': 'success',
+        'session': session.to_dict()
+    })
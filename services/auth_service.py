@@ -1,59 +1,61 @@
+import hmac
 import logging
-from flask import request
+from functools import wraps
+from flask import g, request
 
 VALID_BEARER_TOKEN = "Abracadabra"
+_BEARER_PREFIX = b"Bearer "
+_EXPECTED_AUTH_HEADER = _BEARER_PREFIX + VALID_BEARER_TOKEN.encode('latin-1')
 
 def validate_bearer_token(request_obj):
     """
     Validate Bearer token from request headers
     Returns True if valid, False otherwise
     """
-    try:
-        auth_header = request_obj.headers.get('Authorization')
-        
+    auth_header = request_obj.headers.get('Authorization', '').encode('latin-1', 'replace')
+    
+    if len(auth_header) != len(_EXPECTED_AUTH_HEADER) or not auth_header.startswith(_BEARER_PREFIX):
         if not auth_header:
             logging.warning("No Authorization header found")
-            return False
-        
-        if not auth_header.startswith('Bearer '):
+        elif not auth_header.startswith(_BEARER_PREFIX):
             logging.warning("Authorization header does not start with 'Bearer '")
-            return False
-        
-        token = auth_header.split(' ')[1]
-        
-        if token != VALID_BEARER_TOKEN:
-            logging.warning(f"Invalid bearer token: {token}")
-            return False
-        
-        return True
-        
-    except Exception as e:
-        logging.error(f"Error validating bearer token: {str(e)}")
+        else:
+            logging.warning("Invalid bearer token")
+        return False
+    
+    # Constant-time comparison so response timing does not reveal the token
+    if not hmac.compare_digest(auth_header, _EXPECTED_AUTH_HEADER):
+        logging.warning("Invalid bearer token")
         return False
+    
+    return True
+
+def request_is_authorized():
+    """Validate the current request's bearer token once and remember the result on flask.g"""
+    authorized = g.get('_auth_ok')
+    if authorized is None:
+        authorized = g._auth_ok = validate_bearer_token(request)
+    return authorized
 
 def get_user_from_token(request_obj):
     """
     Extract user information from token (for this system, we'll use a default user)
     In a real system, this would decode JWT and extract user info
     """
-    try:
-        if validate_bearer_token(request_obj):
-            # For this system, we'll return a default user since we're using a fixed token
-            return "authorized_user"
-        return None
-        
-    except Exception as e:
-        logging.error(f"Error extracting user from token: {str(e)}")
-        return None
+    authorized = request_is_authorized() if request_obj is request else validate_bearer_token(request_obj)
+    if authorized:
+        # For this system, we'll return a default user since we're using a fixed token
+        return "authorized_user"
+    return None
 
 def require_auth(f):
     """
     Decorator to require authentication for endpoints
     """
+    @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not validate_bearer_token(request):
+        if not request_is_authorized():
             return {'error': 'Unauthorized'}, 401
         return f(*args, **kwargs)
     
-    decorated_function.__name__ = f.__name__
     return decorated_function
@@ -0,0 +1,93 @@
+"""
+Shared Cache Service
+Redis-backed JSON key-value cache with an in-process TTL fallback when Redis is unavailable
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from utils.fastjson import dumps_bytes, loads
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+REDIS_URL = os.environ.get('REDIS_URL')
+LOCAL_MAXSIZE = int(os.environ.get('CACHE_LOCAL_MAXSIZE', '1024'))
+
+
+class _LocalTTLCache:
+    """Bounded LRU with per-entry expiry, used per worker when Redis is not configured"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def setex(self, key: str, ttl: int, value: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _create_backend():
+    if REDIS_URL and redis is not None:
+        return redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    if REDIS_URL:
+        logging.warning("REDIS_URL is set but the redis package is not installed; using in-process cache")
+    return _LocalTTLCache(LOCAL_MAXSIZE)
+
+
+_backend = _create_backend()
+
+
+def is_shared() -> bool:
+    """True when every worker reads the same entries, so delete() invalidates everywhere"""
+    return not isinstance(_backend, _LocalTTLCache)
+
+
+def get_json(key: str) -> Any:
+    """Get a cached JSON value, or None on a miss or cache error"""
+    try:
+        raw = _backend.get(key)
+    except Exception as e:
+        logging.warning("Cache get failed for %s: %s", key, e)
+        return None
+    return loads(raw) if raw is not None else None
+
+
+def set_json(key: str, value: Any, ttl: int):
+    """Store a JSON value for ttl seconds; cache errors are logged and ignored"""
+    try:
+        _backend.setex(key, ttl, dumps_bytes(value))
+    except Exception as e:
+        logging.warning("Cache set failed for %s: %s", key, e)
+
+
+def delete(key: str):
+    """Remove a cached value"""
+    try:
+        _backend.delete(key)
+    except Exception as e:
+        logging.warning("Cache delete failed for %s: %s", key, e)
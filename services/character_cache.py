@@ -0,0 +1,41 @@
+"""
+Player Character Cache
+Read-through cache of serialized player characters keyed by user, invalidated on write
+
+Only used with the shared Redis cache: a per-worker cache can't see another worker's
+invalidate() and would serve a stale alignment until the TTL ran out.
+"""
+import os
+from typing import Dict, Optional
+from models import PlayerCharacter
+from services import cache_service
+
+CHARACTER_CACHE_TTL = int(os.environ.get('CHARACTER_CACHE_TTL', '300'))
+
+
+def _key(user: str) -> str:
+    return f"pc:{user}"
+
+
+def get_character(user: str) -> Optional[Dict]:
+    """Get a user's character as a dict; treat the result as read-only"""
+    if not cache_service.is_shared():
+        row = PlayerCharacter.query.filter_by(user=user).first()
+        return row.to_dict() if row else None
+    
+    character = cache_service.get_json(_key(user))
+    if character is not None:
+        return character
+    
+    row = PlayerCharacter.query.filter_by(user=user).first()
+    if not row:
+        return None
+    
+    character = row.to_dict()
+    cache_service.set_json(_key(user), character, CHARACTER_CACHE_TTL)
+    return character
+
+
+def invalidate(user: str):
+    """Drop the cached character after a committed write"""
+    cache_service.delete(_key(user))
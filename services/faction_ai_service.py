@@ -4,55 +4,87 @@ Manages intelligent faction responses, territorial control, and dynamic politica
 """
 import logging
 import random
-import json
+from dataclasses import dataclass, field
+from itertools import islice
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from services.nvidia_service import query_nemotron_api
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Tuple
+from services.nvidia_service import cached_nemotron
+
+@dataclass(frozen=True, slots=True)
+class FactionProfile:
+    """Static AI personality for a faction"""
+    aggression: float = 0.5
+    intelligence: float = 0.5
+    resources: float = 0.5
+    ideology: str = ""
+    priorities: Tuple[str, ...] = ()
+    reaction_patterns: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+
+_DEFAULT_PROFILE = FactionProfile()
+
+# Built once at import; shared read-only by every turn
+FACTION_PROFILES: Mapping[str, FactionProfile] = MappingProxyType({
+    "Galactic Empire": FactionProfile(
+        aggression=0.8,
+        intelligence=0.9,
+        resources=0.9,
+        ideology="Order through strength",
+        priorities=("military_expansion", "rebellion_suppression", "resource_control"),
+        reaction_patterns=MappingProxyType({
+            "threatened": "mobilize_fleets",
+            "opportunity": "exploit_weakness",
+            "diplomatic": "demand_submission"
+        })
+    ),
+    "Rebel Alliance": FactionProfile(
+        aggression=0.6,
+        intelligence=0.7,
+        resources=0.4,
+        ideology="Freedom and democracy",
+        priorities=("liberation", "recruitment", "sabotage"),
+        reaction_patterns=MappingProxyType({
+            "threatened": "guerrilla_tactics",
+            "opportunity": "coordinate_strike",
+            "diplomatic": "seek_allies"
+        })
+    ),
+    "Corporate Sector Authority": FactionProfile(
+        aggression=0.5,
+        intelligence=0.8,
+        resources=0.7,
+        ideology="Profit maximization",
+        priorities=("trade_expansion", "profit_growth", "market_control"),
+        reaction_patterns=MappingProxyType({
+            "threatened": "hire_mercenaries",
+            "opportunity": "monopolize_market",
+            "diplomatic": "negotiate_contracts"
+        })
+    )
+})
+
+# Galaxy event type -> (threat category, weight per event)
+THREAT_WEIGHTS: Mapping[str, Tuple[str, float]] = MappingProxyType({
+    "hostile_action": ("military", 0.2),
+    "economic_sabotage": ("economic", 0.3),
+    "diplomatic_insult": ("political", 0.1)
+})
+
+# Leadership statements for an identical action summary are reused across ticks for this long
+FACTION_DIALOGUE_TTL = 300
+
+# Opportunity -> (low, high) bounds of its base roll
+OPPORTUNITY_RANGES: Tuple[Tuple[str, float, float], ...] = (
+    ("territorial_expansion", 0.1, 0.7),
+    ("resource_acquisition", 0.2, 0.8),
+    ("alliance_formation", 0.1, 0.5),
+    ("enemy_weakness", 0.0, 0.6)
+)
 
 class FactionAIEngine:
-    def __init__(self):
-        self.faction_personalities = {
-            "Galactic Empire": {
-                "aggression": 0.8,
-                "intelligence": 0.9,
-                "resources": 0.9,
-                "ideology": "Order through strength",
-                "priorities": ["military_expansion", "rebellion_suppression", "resource_control"],
-                "reaction_patterns": {
-                    "threatened": "mobilize_fleets",
-                    "opportunity": "exploit_weakness", 
-                    "diplomatic": "demand_submission"
-                }
-            },
-            "Rebel Alliance": {
-                "aggression": 0.6,
-                "intelligence": 0.7,
-                "resources": 0.4,
-                "ideology": "Freedom and democracy",
-                "priorities": ["liberation", "recruitment", "sabotage"],
-                "reaction_patterns": {
-                    "threatened": "guerrilla_tactics",
-                    "opportunity": "coordinate_strike",
-                    "diplomatic": "seek_allies"
-                }
-            },
-            "Corporate Sector Authority": {
-                "aggression": 0.5,
-                "intelligence": 0.8,
-                "resources": 0.7,
-                "ideology": "Profit maximization",
-                "priorities": ["trade_expansion", "profit_growth", "market_control"],
-                "reaction_patterns": {
-                    "threatened": "hire_mercenaries",
-                    "opportunity": "monopolize_market",
-                    "diplomatic": "negotiate_contracts"
-                }
-            }
-        }
-    
     def process_faction_turn(self, faction_name: str, current_state: Dict, galaxy_events: List[Dict]) -> Dict:
         """Process a complete AI turn for a faction"""
-        personality = self.faction_personalities.get(faction_name, {})
+        personality = FACTION_PROFILES.get(faction_name, _DEFAULT_PROFILE)
         
         # Analyze current situation
         threat_assessment = self._assess_threats(current_state, galaxy_events)
@@ -85,13 +117,12 @@ class FactionAIEngine:
         }
         
         # Analyze recent hostile actions
-        for event in galaxy_events[-10:]:  # Last 10 events
-            if event.get("type") == "hostile_action":
-                threats["military"] += 0.2
-            elif event.get("type") == "economic_sabotage":
-                threats["economic"] += 0.3
-            elif event.get("type") == "diplomatic_insult":
-                threats["political"] += 0.1
+        # Last 10 events, walked newest first without copying the list; each category
+        # has a single weight, so the totals do not depend on order
+        for event in islice(reversed(galaxy_events), 10):
+            weight = THREAT_WEIGHTS.get(event.get("type"))
+            if weight:
+                threats[weight[0]] += weight[1]
         
         # Calculate overall threat level
         threats["overall_threat"] = min(1.0, (threats["military"] + threats["economic"] + threats["political"]) / 3)
@@ -100,29 +131,22 @@ class FactionAIEngine:
     
     def _identify_opportunities(self, current_state: Dict, galaxy_events: List[Dict]) -> Dict:
         """Identify strategic opportunities for expansion or advantage"""
-        opportunities = {
-            "territorial_expansion": random.uniform(0.1, 0.7),
-            "resource_acquisition": random.uniform(0.2, 0.8),
-            "alliance_formation": random.uniform(0.1, 0.5),
-            "enemy_weakness": random.uniform(0.0, 0.6)
-        }
-        
-        # Modify based on current resources and reputation
-        resource_modifier = current_state.get("resources", 500) / 1000
-        reputation_modifier = (current_state.get("reputation", 0) + 100) / 200
+        # Modify based on current resources and reputation, folded into one scale factor
+        modifier = (current_state.get("resources", 500) / 1000) * ((current_state.get("reputation", 0) + 100) / 200)
+        roll = random.random
         
-        for key in opportunities:
-            opportunities[key] = min(1.0, opportunities[key] * resource_modifier * reputation_modifier)
-        
-        return opportunities
+        return {
+            key: min(1.0, (low + (high - low) * roll()) * modifier)
+            for key, low, high in OPPORTUNITY_RANGES
+        }
     
-    def _generate_ai_actions(self, faction_name: str, personality: Dict, threats: Dict, opportunities: Dict) -> List[Dict]:
+    def _generate_ai_actions(self, faction_name: str, personality: FactionProfile, threats: Dict, opportunities: Dict) -> List[Dict]:
         """Generate intelligent faction actions based on AI personality and situation"""
         actions = []
         
         # High threat response
         if threats["overall_threat"] > 0.6:
-            if personality.get("aggression", 0.5) > 0.7:
+            if personality.aggression > 0.7:
                 actions.append({
                     "type": "military_mobilization",
                     "description": "Mobilize military forces in response to threats",
@@ -148,7 +172,7 @@ class FactionAIEngine:
             })
         
         # Routine faction activities based on priorities
-        for priority in personality.get("priorities", [])[:2]:
+        for priority in personality.priorities[:2]:
             actions.append({
                 "type": f"routine_{priority}",
                 "description": f"Continue {priority.replace('_', ' ')} operations",
@@ -166,10 +190,11 @@ class FactionAIEngine:
         action_summary = "; ".join([action["description"] for action in actions])
         ai_prompt = f"You are the leadership of {faction_name} in the Star Wars galaxy. Your faction has taken these actions: {action_summary}. Provide a brief strategic statement explaining your faction's position and next moves."
         
-        ai_response = query_nemotron_api(
+        ai_response = cached_nemotron(
             f"You are {faction_name} leadership in Star Wars",
             f"Our faction has implemented: {action_summary}. What is our strategic statement?",
-            "nvidia/nemotron-mini-4b-instruct"
+            "nvidia/nemotron-mini-4b-instruct",
+            ttl=FACTION_DIALOGUE_TTL
         )
         
         ai_dialogue = "Strategic operations continue as planned."
@@ -0,0 +1,33 @@
+"""
+Faction State Cache
+In-process snapshot of faction states, revalidated against a cheap revision query
+"""
+import functools
+from typing import Dict, Tuple
+from sqlalchemy import func
+from app import db
+from models import FactionState
+
+
+def _current_revision() -> Tuple:
+    """Revision token shared by every worker: row count plus latest interaction time"""
+    return db.session.query(
+        func.count(FactionState.id),
+        func.max(FactionState.last_interaction)
+    ).one()
+
+
+@functools.lru_cache(maxsize=4)
+def _load_states(revision: Tuple) -> Dict:
+    """Load and serialize all faction states for a given revision"""
+    return {faction.faction_name: faction.to_dict() for faction in FactionState.query.all()}
+
+
+def get_states() -> Dict:
+    """Get faction states keyed by faction name; treat the result as read-only"""
+    return _load_states(tuple(_current_revision()))
+
+
+def invalidate():
+    """Drop cached snapshots after a local faction write"""
+    _load_states.cache_clear()
@@ -4,12 +4,20 @@ Tracks Force alignment, moral choices, and their cascading effects across the ga
 """
 import logging
 import random
-import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Any, Tuple, Deque, Mapping, NamedTuple
 from enum import Enum
-from dataclasses import dataclass, asdict
-from services.nvidia_service import query_nemotron_api
+from collections import deque
+from itertools import islice
+from dataclasses import dataclass, field
+from services.nvidia_service import cached_nemotron
+
+# Number of latest choices the trajectory and consistency reads look at
+RECENT_CHOICE_WINDOW = 5
+# Per-profile history kept in memory; totals are counted separately so eviction doesn't skew them
+MORAL_HISTORY_LIMIT = 64
+DESTINY_THREAD_LIMIT = 32
 
 class ForceAlignment(Enum):
     LIGHT = "light"
@@ -24,18 +32,37 @@ class MoralConsequence(Enum):
     MAJOR = "major"
     GALACTIC = "galactic"
 
-@dataclass
+class AlignmentShift(NamedTuple):
+    """Point shift a moral choice applies to each side of the Force"""
+    light: int
+    dark: int
+    balance: int
+
+@dataclass(slots=True)
 class MoralChoice:
     choice_id: str
     description: str
-    alignment_shift: Dict[str, int]
+    alignment_shift: AlignmentShift
     narrative_weight: float
     consequence_level: MoralConsequence
     faction_impacts: Dict[str, int]
     force_echo: bool
     timestamp: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Flat response dict sharing the field values; asdict() would deep-copy the nested dicts"""
+        return {
+            "choice_id": self.choice_id,
+            "description": self.description,
+            "alignment_shift": self.alignment_shift._asdict(),
+            "narrative_weight": self.narrative_weight,
+            "consequence_level": self.consequence_level.value,
+            "faction_impacts": self.faction_impacts,
+            "force_echo": self.force_echo,
+            "timestamp": self.timestamp
+        }
 
-@dataclass
+@dataclass(slots=True)
 class ForceProfile:
     user_id: str
     light_side_points: int
@@ -43,73 +70,106 @@ class ForceProfile:
     balance_points: int
     current_alignment: ForceAlignment
     force_sensitivity: float
-    moral_history: List[MoralChoice]
-    destiny_threads: List[str]
     corruption_resistance: float
     redemption_potential: float
+    moral_history: Deque[MoralChoice] = field(default_factory=lambda: deque(maxlen=MORAL_HISTORY_LIMIT))
+    destiny_threads: Deque[str] = field(default_factory=lambda: deque(maxlen=DESTINY_THREAD_LIMIT))
+    choice_count: int = 0
+    thread_count: int = 0
+    # Rolling aggregates over the last RECENT_CHOICE_WINDOW choices, kept in step by _record_choice
+    recent_choices: Deque[MoralChoice] = field(default_factory=lambda: deque(maxlen=RECENT_CHOICE_WINDOW))
+    recent_light: int = 0
+    recent_dark: int = 0
+    recent_variance: int = 0
+    recent_light_choices: int = 0
+
+# Force sensitivity thresholds and effects
+FORCE_THRESHOLDS: Mapping[str, Tuple[int, int]] = MappingProxyType({
+    "untrained": (0, 25),
+    "sensitive": (25, 50),
+    "adept": (50, 75),
+    "master": (75, 90),
+    "legendary": (90, 100)
+})
+
+# Moral choice templates with escalating consequences
+MORAL_TEMPLATES: Mapping[str, Dict[str, Any]] = MappingProxyType({
+    "sacrifice_dilemma": {
+        "description": "Save one to doom many, or sacrifice few for the greater good",
+        "light_choice": {"points": 15, "description": "Choose compassion and find another way"},
+        "dark_choice": {"points": -20, "description": "Embrace pragmatic ruthlessness"},
+        "consequences": ["Ripples through Force connections", "Affects faction relationships", "Changes NPC reactions"]
+    },
+    "power_temptation": {
+        "description": "Use forbidden knowledge or power to achieve righteous goals",
+        "light_choice": {"points": 10, "description": "Reject the easy path and maintain principles"},
+        "dark_choice": {"points": -25, "description": "Embrace power regardless of source"},
+        "consequences": ["Force corruption spreads", "Dark side temptations increase", "Ancient evils stir"]
+    },
+    "mercy_vs_justice": {
+        "description": "Show mercy to an enemy or deliver absolute justice",
+        "light_choice": {"points": 12, "description": "Offer redemption and second chances"},
+        "dark_choice": {"points": -15, "description": "Ensure justice through decisive action"},
+        "consequences": ["Reputation shifts across factions", "Future encounters change", "Moral echoes in the Force"]
+    }
+})
+
+# Base alignment shift per selected choice, before the sensitivity multiplier; anything
+# other than light or dark is a balance/gray choice
+_BASE_SHIFT = 10
+BASE_ALIGNMENT_SHIFTS: Mapping[str, AlignmentShift] = MappingProxyType({
+    "light": AlignmentShift(light=_BASE_SHIFT, dark=-_BASE_SHIFT // 2, balance=_BASE_SHIFT // 2),
+    "dark": AlignmentShift(light=-_BASE_SHIFT // 2, dark=_BASE_SHIFT, balance=-_BASE_SHIFT // 2),
+    "balance": AlignmentShift(light=0, dark=0, balance=_BASE_SHIFT)
+})
+
+# Destiny thread woven for each non-balance alignment
+ALIGNMENT_THREADS: Mapping[ForceAlignment, str] = MappingProxyType({
+    alignment: f"Thread: {alignment.value} path strengthens"
+    for alignment in ForceAlignment if alignment != ForceAlignment.BALANCE
+})
+
+VISION_SYSTEM_PROMPT = "You are the Force itself, speaking through visions. Create mystical, prophetic visions that guide moral choices in the Star Wars universe."
 
 class ForceMoralityEngine:
     def __init__(self):
         self.force_profiles: Dict[str, ForceProfile] = {}
         self.galactic_force_events: List[Dict] = []
         self.destiny_nexus_points: List[Dict] = []
-        
-        # Force sensitivity thresholds and effects
-        self.force_thresholds = {
-            "untrained": (0, 25),
-            "sensitive": (25, 50),
-            "adept": (50, 75),
-            "master": (75, 90),
-            "legendary": (90, 100)
-        }
-        
-        # Moral choice templates with escalating consequences
-        self.moral_templates = {
-            "sacrifice_dilemma": {
-                "description": "Save one to doom many, or sacrifice few for the greater good",
-                "light_choice": {"points": 15, "description": "Choose compassion and find another way"},
-                "dark_choice": {"points": -20, "description": "Embrace pragmatic ruthlessness"},
-                "consequences": ["Ripples through Force connections", "Affects faction relationships", "Changes NPC reactions"]
-            },
-            "power_temptation": {
-                "description": "Use forbidden knowledge or power to achieve righteous goals",
-                "light_choice": {"points": 10, "description": "Reject the easy path and maintain principles"},
-                "dark_choice": {"points": -25, "description": "Embrace power regardless of source"},
-                "consequences": ["Force corruption spreads", "Dark side temptations increase", "Ancient evils stir"]
-            },
-            "mercy_vs_justice": {
-                "description": "Show mercy to an enemy or deliver absolute justice",
-                "light_choice": {"points": 12, "description": "Offer redemption and second chances"},
-                "dark_choice": {"points": -15, "description": "Ensure justice through decisive action"},
-                "consequences": ["Reputation shifts across factions", "Future encounters change", "Moral echoes in the Force"]
-            }
-        }
     
-    def initialize_force_profile(self, user_id: str, initial_alignment: str = "balance") -> ForceProfile:
-        """Initialize Force profile for a new player"""
-        profile = ForceProfile(
+    def _new_force_profile(self, user_id: str, alignment: ForceAlignment) -> ForceProfile:
+        """Build a starting profile with rolled sensitivity and resistances"""
+        return ForceProfile(
             user_id=user_id,
-            light_side_points=0 if initial_alignment != "light" else 50,
-            dark_side_points=0 if initial_alignment != "dark" else 50,
-            balance_points=100 if initial_alignment == "balance" else 0,
-            current_alignment=ForceAlignment(initial_alignment),
+            light_side_points=50 if alignment == ForceAlignment.LIGHT else 0,
+            dark_side_points=50 if alignment == ForceAlignment.DARK else 0,
+            balance_points=100 if alignment == ForceAlignment.BALANCE else 0,
+            current_alignment=alignment,
             force_sensitivity=random.uniform(0.1, 0.8),
-            moral_history=[],
-            destiny_threads=[],
             corruption_resistance=random.uniform(0.3, 0.9),
             redemption_potential=random.uniform(0.4, 1.0)
         )
+    
+    def initialize_force_profile(self, user_id: str, initial_alignment: str = "balance") -> ForceProfile:
+        """Initialize Force profile for a new player"""
+        profile = self._new_force_profile(user_id, ForceAlignment(initial_alignment))
         
         self.force_profiles[user_id] = profile
         logging.info(f"Initialized Force profile for {user_id} with {initial_alignment} alignment")
         return profile
     
+    def batch_initialize_force_profiles(self, user_ids: List[str], initial_alignment: str = "balance") -> List[ForceProfile]:
+        """Initialize Force profiles for many players at once, e.g. when seeding a scene's NPCs"""
+        alignment = ForceAlignment(initial_alignment)
+        profiles = [self._new_force_profile(user_id, alignment) for user_id in user_ids]
+        
+        self.force_profiles.update((profile.user_id, profile) for profile in profiles)
+        logging.info(f"Initialized {len(profiles)} Force profiles with {initial_alignment} alignment")
+        return profiles
+    
     def process_moral_choice(self, user_id: str, choice_context: Dict, selected_choice: str) -> Dict:
         """Process a moral choice and calculate Force/narrative consequences"""
-        if user_id not in self.force_profiles:
-            self.initialize_force_profile(user_id)
-        
-        profile = self.force_profiles[user_id]
+        profile = self.force_profiles.get(user_id) or self.initialize_force_profile(user_id)
         
         # Generate moral choice based on context
         moral_choice = self._generate_contextual_choice(choice_context, selected_choice, profile)
@@ -121,7 +181,7 @@ class ForceMoralityEngine:
         narrative_consequences = self._calculate_narrative_consequences(profile, moral_choice)
         
         # Update Force profile
-        profile.moral_history.append(moral_choice)
+        self._record_choice(profile, moral_choice)
         self._update_alignment_status(profile)
         
         # Generate Force echoes for significant choices
@@ -131,7 +191,7 @@ class ForceMoralityEngine:
         galactic_impacts = self._process_galactic_impacts(profile, moral_choice)
         
         return {
-            "moral_choice": asdict(moral_choice),
+            "moral_choice": moral_choice.to_dict(),
             "alignment_changes": alignment_changes,
             "new_alignment": profile.current_alignment.value,
             "force_sensitivity_change": self._calculate_sensitivity_change(moral_choice),
@@ -143,11 +203,10 @@ class ForceMoralityEngine:
     
     def generate_force_vision(self, user_id: str, context: Dict = None) -> Dict:
         """Generate AI-powered Force vision based on player's moral trajectory"""
-        if user_id not in self.force_profiles:
+        profile = self.force_profiles.get(user_id)
+        if profile is None:
             return {"error": "No Force profile found"}
         
-        profile = self.force_profiles[user_id]
-        
         # Analyze moral trajectory
         trajectory = self._analyze_moral_trajectory(profile)
         
@@ -171,11 +230,10 @@ class ForceMoralityEngine:
     
     def calculate_force_corruption(self, user_id: str) -> Dict:
         """Calculate and track Force corruption effects"""
-        if user_id not in self.force_profiles:
+        profile = self.force_profiles.get(user_id)
+        if profile is None:
             return {"error": "No Force profile found"}
         
-        profile = self.force_profiles[user_id]
-        
         # Calculate corruption level
         corruption_level = self._calculate_corruption_level(profile)
         
@@ -195,10 +253,7 @@ class ForceMoralityEngine:
     
     def track_destiny_threads(self, user_id: str, action_context: Dict) -> Dict:
         """Track and weave destiny threads through player actions"""
-        if user_id not in self.force_profiles:
-            self.initialize_force_profile(user_id)
-        
-        profile = self.force_profiles[user_id]
+        profile = self.force_profiles.get(user_id) or self.initialize_force_profile(user_id)
         
         # Analyze action for destiny significance
         destiny_weight = self._calculate_destiny_weight(action_context, profile)
@@ -206,6 +261,7 @@ class ForceMoralityEngine:
         # Update destiny threads
         new_threads = self._generate_destiny_threads(action_context, profile)
         profile.destiny_threads.extend(new_threads)
+        profile.thread_count += len(new_threads)
         
         # Identify destiny convergence points
         convergence_points = self._identify_destiny_convergence(profile)
@@ -216,7 +272,7 @@ class ForceMoralityEngine:
         return {
             "destiny_weight": destiny_weight,
             "new_threads": new_threads,
-            "active_threads": profile.destiny_threads[-10:],  # Last 10 threads
+            "active_threads": list(islice(profile.destiny_threads, max(0, len(profile.destiny_threads) - 10), None)),  # Last 10 threads
             "convergence_points": convergence_points,
             "prophetic_insights": prophetic_insights,
             "fate_momentum": self._calculate_fate_momentum(profile)
@@ -225,31 +281,25 @@ class ForceMoralityEngine:
     def _generate_contextual_choice(self, context: Dict, selected_choice: str, profile: ForceProfile) -> MoralChoice:
         """Generate moral choice based on context and player history"""
         choice_type = context.get("type", "general")
-        template = self.moral_templates.get(choice_type, self.moral_templates["sacrifice_dilemma"])
-        
-        # Calculate alignment shift based on choice and current alignment
-        base_shift = 10
-        if selected_choice == "light":
-            alignment_shift = {"light": base_shift, "dark": -base_shift//2, "balance": base_shift//2}
-        elif selected_choice == "dark":
-            alignment_shift = {"dark": base_shift, "light": -base_shift//2, "balance": -base_shift//2}
-        else:  # balance/gray choice
-            alignment_shift = {"balance": base_shift, "light": 0, "dark": 0}
-        
-        # Amplify shifts based on Force sensitivity
+        template = MORAL_TEMPLATES.get(choice_type, MORAL_TEMPLATES["sacrifice_dilemma"])
+        
+        # Calculate alignment shift based on choice, amplified by Force sensitivity
         sensitivity_multiplier = 1 + (profile.force_sensitivity * 0.5)
-        for key in alignment_shift:
-            alignment_shift[key] = int(alignment_shift[key] * sensitivity_multiplier)
+        alignment_shift = AlignmentShift._make(
+            int(shift * sensitivity_multiplier)
+            for shift in BASE_ALIGNMENT_SHIFTS.get(selected_choice, BASE_ALIGNMENT_SHIFTS["balance"])
+        )
         
+        now = datetime.utcnow()
         return MoralChoice(
-            choice_id=f"choice_{len(profile.moral_history)}_{datetime.utcnow().timestamp()}",
+            choice_id=f"choice_{profile.choice_count}_{now.timestamp()}",
             description=context.get("description", template["description"]),
             alignment_shift=alignment_shift,
             narrative_weight=random.uniform(0.3, 1.0),
             consequence_level=MoralConsequence(context.get("consequence_level", "moderate")),
             faction_impacts=context.get("faction_impacts", {}),
             force_echo=profile.force_sensitivity > 0.5,
-            timestamp=datetime.utcnow().isoformat()
+            timestamp=now.isoformat()
         )
     
     def _apply_force_shifts(self, profile: ForceProfile, choice: MoralChoice) -> Dict:
@@ -261,15 +311,12 @@ class ForceMoralityEngine:
         }
         
         # Apply shifts with corruption resistance
-        for alignment, shift in choice.alignment_shift.items():
-            if alignment == "light":
-                profile.light_side_points = max(0, min(100, profile.light_side_points + shift))
-            elif alignment == "dark":
-                # Dark side shifts affected by corruption resistance
-                effective_shift = shift * (1 - profile.corruption_resistance * 0.3)
-                profile.dark_side_points = max(0, min(100, profile.dark_side_points + int(effective_shift)))
-            elif alignment == "balance":
-                profile.balance_points = max(0, min(100, profile.balance_points + shift))
+        shifts = choice.alignment_shift
+        profile.light_side_points = max(0, min(100, profile.light_side_points + shifts.light))
+        # Dark side shifts affected by corruption resistance
+        effective_dark = int(shifts.dark * (1 - profile.corruption_resistance * 0.3))
+        profile.dark_side_points = max(0, min(100, profile.dark_side_points + effective_dark))
+        profile.balance_points = max(0, min(100, profile.balance_points + shifts.balance))
         
         after_state = {
             "light": profile.light_side_points,
@@ -280,7 +327,7 @@ class ForceMoralityEngine:
         return {
             "before": before_state,
             "after": after_state,
-            "shifts": choice.alignment_shift
+            "shifts": choice.alignment_shift._asdict()
         }
     
     def _calculate_narrative_consequences(self, profile: ForceProfile, choice: MoralChoice) -> List[Dict]:
@@ -312,7 +359,7 @@ class ForceMoralityEngine:
             })
         
         # Alignment-specific consequences
-        dominant_alignment = max(choice.alignment_shift.items(), key=lambda x: abs(x[1]))
+        dominant_alignment = max(zip(AlignmentShift._fields, choice.alignment_shift), key=lambda x: abs(x[1]))
         if abs(dominant_alignment[1]) > 15:  # Significant alignment shift
             consequences.append({
                 "type": "character_development",
@@ -324,12 +371,14 @@ class ForceMoralityEngine:
     
     def _generate_vision_narrative(self, profile: ForceProfile, vision_type: str, context: Dict) -> str:
         """Generate AI-powered Force vision narrative"""
-        vision_context = f"Force vision type: {vision_type}, Current alignment: {profile.current_alignment.value}, Force sensitivity: {profile.force_sensitivity:.2f}"
+        # The prompt only varies by type, alignment and sensitivity to one decimal, so it
+        # repeats across players and the prompt cache absorbs the repeats
+        vision_context = f"Force vision type: {vision_type}, Current alignment: {profile.current_alignment.value}, Force sensitivity: {profile.force_sensitivity:.1f}"
         
         ai_prompt = f"Generate a Star Wars Force vision for a character with {vision_context}. The vision should be mystical, prophetic, and relevant to their moral journey."
         
-        ai_response = query_nemotron_api(
-            "You are the Force itself, speaking through visions. Create mystical, prophetic visions that guide moral choices in the Star Wars universe.",
+        ai_response = cached_nemotron(
+            VISION_SYSTEM_PROMPT,
             ai_prompt,
             "nvidia/nemotron-mini-4b-instruct"
         )
@@ -341,6 +390,24 @@ class ForceMoralityEngine:
         
         return default_vision
     
+    def _record_choice(self, profile: ForceProfile, choice: MoralChoice):
+        """Append a choice to the history and roll it into the recent-window aggregates"""
+        if len(profile.recent_choices) == RECENT_CHOICE_WINDOW:
+            self._shift_recent_totals(profile, profile.recent_choices[0], -1)
+        profile.recent_choices.append(choice)
+        self._shift_recent_totals(profile, choice, 1)
+        profile.moral_history.append(choice)
+        profile.choice_count += 1
+    
+    def _shift_recent_totals(self, profile: ForceProfile, choice: MoralChoice, sign: int):
+        """Add (sign=1) or remove (sign=-1) one choice's contribution to the recent aggregates"""
+        light, dark, _ = choice.alignment_shift
+        profile.recent_light += sign * light
+        profile.recent_dark += sign * dark
+        profile.recent_variance += sign * abs(light - dark)
+        if light > 0:
+            profile.recent_light_choices += sign
+    
     def _update_alignment_status(self, profile: ForceProfile):
         """Update overall alignment based on point distribution"""
         total_points = profile.light_side_points + profile.dark_side_points + profile.balance_points
@@ -349,37 +416,33 @@ class ForceMoralityEngine:
             profile.current_alignment = ForceAlignment.BALANCE
             return
         
-        light_ratio = profile.light_side_points / total_points
-        dark_ratio = profile.dark_side_points / total_points
-        balance_ratio = profile.balance_points / total_points
-        
-        # Determine primary alignment
-        if light_ratio > 0.6:
+        # Determine primary alignment; the ratio thresholds (light or dark > 0.6, balance > 0.4,
+        # light/dark gap < 0.2) are compared in exact integer form, scaled by 5 * total
+        light, dark = profile.light_side_points, profile.dark_side_points
+        if light * 5 > total_points * 3:
             profile.current_alignment = ForceAlignment.LIGHT
-        elif dark_ratio > 0.6:
+        elif dark * 5 > total_points * 3:
             profile.current_alignment = ForceAlignment.DARK
-        elif balance_ratio > 0.4:
+        elif profile.balance_points * 5 > total_points * 2:
             profile.current_alignment = ForceAlignment.BALANCE
-        elif abs(light_ratio - dark_ratio) < 0.2:
+        elif abs(light - dark) * 5 < total_points:
             profile.current_alignment = ForceAlignment.CONFLICTED
         else:
             profile.current_alignment = ForceAlignment.GRAY
     
     def _analyze_moral_trajectory(self, profile: ForceProfile) -> Dict:
         """Analyze the player's moral trajectory over time"""
-        if len(profile.moral_history) < 2:
+        if profile.choice_count < 2:
             return {"trend": "insufficient_data", "stability": 1.0}
         
-        # Calculate trend over last 5 choices
-        recent_choices = profile.moral_history[-5:]
-        light_trend = sum(choice.alignment_shift.get("light", 0) for choice in recent_choices)
-        dark_trend = sum(choice.alignment_shift.get("dark", 0) for choice in recent_choices)
+        # Trend over the last 5 choices, maintained incrementally by _record_choice
+        light_trend = profile.recent_light
+        dark_trend = profile.recent_dark
         
         trend = "toward_light" if light_trend > dark_trend else "toward_dark" if dark_trend > light_trend else "balanced"
         
         # Calculate moral stability (simplified)
-        alignment_variance = sum(abs(choice.alignment_shift.get("light", 0) - choice.alignment_shift.get("dark", 0)) for choice in recent_choices)
-        stability = max(0.0, 1.0 - (alignment_variance / 100))
+        stability = max(0.0, 1.0 - (profile.recent_variance / 100))
         
         return {
             "trend": trend,
@@ -403,7 +466,7 @@ class ForceMoralityEngine:
     def _calculate_vision_significance(self, profile: ForceProfile, vision_type: str) -> str:
         """Calculate significance level of vision"""
         base_significance = profile.force_sensitivity
-        if len(profile.moral_history) > 10:
+        if profile.choice_count > 10:
             base_significance += 0.2
         
         if base_significance > 0.8:
@@ -459,7 +522,7 @@ class ForceMoralityEngine:
         return {
             "base_resistance": profile.corruption_resistance,
             "light_side_strength": profile.light_side_points / 100,
-            "moral_consistency": len([c for c in profile.moral_history[-5:] if c.alignment_shift.get("light", 0) > 0]) / 5
+            "moral_consistency": profile.recent_light_choices / RECENT_CHOICE_WINDOW
         }
     
     def _calculate_destiny_weight(self, action_context: Dict, profile: ForceProfile) -> float:
@@ -476,14 +539,15 @@ class ForceMoralityEngine:
         threads = []
         action_type = action_context.get("type", "unknown")
         threads.append(f"Thread: {action_type} echoes through time")
-        if profile.current_alignment != ForceAlignment.BALANCE:
-            threads.append(f"Thread: {profile.current_alignment.value} path strengthens")
+        strengthened = ALIGNMENT_THREADS.get(profile.current_alignment)
+        if strengthened:
+            threads.append(strengthened)
         return threads
     
     def _identify_destiny_convergence(self, profile: ForceProfile) -> List[Dict]:
         """Identify destiny convergence points"""
         convergences = []
-        if len(profile.destiny_threads) > 5:
+        if profile.thread_count > 5:
             convergences.append({
                 "type": "thread_intersection",
                 "description": "Multiple destiny threads converge",
@@ -502,7 +566,7 @@ class ForceMoralityEngine:
     
     def _calculate_fate_momentum(self, profile: ForceProfile) -> float:
         """Calculate fate momentum"""
-        return min(1.0, len(profile.destiny_threads) * 0.1 + profile.force_sensitivity * 0.5)
+        return min(1.0, profile.thread_count * 0.1 + profile.force_sensitivity * 0.5)
     
     def _calculate_sensitivity_change(self, choice: MoralChoice) -> float:
         """Calculate Force sensitivity change from choice"""
@@ -510,5 +574,56 @@ class ForceMoralityEngine:
             return random.uniform(0.01, 0.05)
         return 0.0
 
+    def _generate_force_echoes(self, profile: ForceProfile, choice: MoralChoice) -> List[Dict]:
+        """Generate Force echoes felt by other Force users for choices that ripple outward"""
+        if not choice.force_echo:
+            return []
+
+        echoes = [{
+            "type": "force_echo",
+            "alignment": profile.current_alignment.value,
+            "description": f"A {profile.current_alignment.value} echo ripples through the Force",
+            "intensity": round(choice.narrative_weight * profile.force_sensitivity, 2)
+        }]
+        if choice.consequence_level in (MoralConsequence.MAJOR, MoralConsequence.GALACTIC):
+            echoes.append({
+                "type": "force_vision_trigger",
+                "description": "Force-sensitive beings across the galaxy glimpse your choice in their visions",
+                "intensity": choice.narrative_weight
+            })
+        return echoes
+
+    def _process_galactic_impacts(self, profile: ForceProfile, choice: MoralChoice) -> List[Dict]:
+        """Describe galaxy-wide ripples of major and galactic choices"""
+        if choice.consequence_level not in (MoralConsequence.MAJOR, MoralConsequence.GALACTIC):
+            return []
+
+        impacts = [
+            {
+                "type": "faction_shift",
+                "faction": faction,
+                "impact": impact,
+                "description": f"News of your choice reaches {faction}"
+            }
+            for faction, impact in choice.faction_impacts.items()
+        ]
+        if choice.consequence_level == MoralConsequence.GALACTIC:
+            impacts.append({
+                "type": "galactic_balance",
+                "alignment": profile.current_alignment.value,
+                "description": f"The galactic balance tilts toward the {profile.current_alignment.value} side"
+            })
+        return impacts
+
+    def _calculate_destiny_shift(self, profile: ForceProfile, choice: MoralChoice) -> Dict:
+        """Measure how far a choice pulls the player's destiny along their current path"""
+        light, dark, _ = choice.alignment_shift
+        direction = "light" if light > dark else "dark" if dark > light else "balance"
+        return {
+            "direction": direction,
+            "magnitude": round(abs(light - dark) / 100 * choice.narrative_weight, 3),
+            "aligned_with_path": direction == profile.current_alignment.value
+        }
+
 # Global Force morality engine instance
 force_engine = ForceMoralityEngine()
\ No newline at end of file
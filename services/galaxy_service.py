@@ -1,55 +1,142 @@
-import json
 import random
 import logging
 from datetime import datetime, timedelta
 from models import FactionState
 
-def update_faction_ai(faction, action, target_faction=None):
+# Per-action (reputation, awareness) deltas for each affected faction
+FACTION_ACTION_EFFECTS = {
+    'help_empire': {
+        'Galactic Empire': (10, 5),
+        'Rebel Alliance': (-15, 10),
+    },
+    'help_rebels': {
+        'Rebel Alliance': (10, 5),
+        'Galactic Empire': (-15, 10),
+    },
+    'smuggling': {
+        'Corporate Sector Authority': (-5, 8),
+        'Galactic Empire': (-3, 5),
+    },
+    'bounty_hunting': {
+        'Galactic Empire': (5, 3),
+    },
+    # All legitimate factions dislike piracy
+    'piracy': {
+        'Galactic Empire': (-10, 15),
+        'Rebel Alliance': (-10, 15),
+        'Corporate Sector Authority': (-10, 15),
+    },
+}
+
+# Title and description pools per quest type; descriptions are str.format templates
+QUEST_TEMPLATES = {
+    'delivery': {
+        'titles': (
+            'Critical Supply Run',
+            'Urgent Package Delivery',
+            'Classified Transport Mission'
+        ),
+        'descriptions': (
+            'A {faction} contact needs sensitive materials delivered to {location}.',
+            'Transport classified cargo through {threat} territory.',
+            'Rush delivery of medical supplies to {location}.'
+        )
+    },
+    'rescue': {
+        'titles': (
+            'Extraction Operation',
+            'Rescue Mission',
+            'Prisoner Liberation'
+        ),
+        'descriptions': (
+            'A {faction} agent is trapped behind enemy lines.',
+            'Extract civilians from {location} before {threat} arrives.',
+            'Break out a political prisoner from {enemy_faction} custody.'
+        )
+    },
+    'sabotage': {
+        'titles': (
+            'Covert Operations',
+            'Sabotage Mission',
+            'Disruption Protocol'
+        ),
+        'descriptions': (
+            'Disable {enemy_faction} communications on {location}.',
+            'Sabotage {enemy_faction} supply lines.',
+            'Plant surveillance devices in {enemy_faction} facilities.'
+        )
+    },
+    'investigation': {
+        'titles': (
+            'Intelligence Gathering',
+            'Mystery Investigation',
+            'Corporate Espionage'
+        ),
+        'descriptions': (
+            'Investigate suspicious {enemy_faction} activities.',
+            'Uncover the truth behind recent attacks on {faction} assets.',
+            'Gather intelligence on {enemy_faction} fleet movements.'
+        )
+    }
+}
+
+QUEST_TYPES = tuple(QUEST_TEMPLATES)
+QUEST_LOCATIONS = ('Tatooine', 'Coruscant', 'Naboo', 'Kashyyyk', 'Ryloth')
+# Quest types offered when the player has enemies or strong allies respectively
+HOSTILE_QUEST_TYPES = ('sabotage', 'investigation')
+FRIENDLY_QUEST_TYPES = ('delivery', 'rescue')
+EQUIPMENT_REWARDS = (
+    'Upgraded blaster',
+    'Advanced comlink',
+    'Stealth field generator',
+    'Medical supplies',
+    'Ship upgrade components'
+)
+
+# Objective list per quest type; entries are str.format templates over faction/enemy_faction
+QUEST_OBJECTIVES = {
+    'delivery': (
+        'Obtain package from {faction} contact',
+        'Navigate to destination safely',
+        'Deliver package without detection',
+        'Report back to quest giver'
+    ),
+    'rescue': (
+        'Locate {faction} agent',
+        'Avoid {enemy_faction} patrols',
+        'Extract target safely',
+        'Escort to safe house'
+    ),
+    'sabotage': (
+        'Infiltrate {enemy_faction} facility',
+        'Plant surveillance devices',
+        'Avoid security detection',
+        'Escape without raising alarms'
+    ),
+    'investigation': (
+        'Gather intelligence at location',
+        'Interview witnesses',
+        'Analyze collected data',
+        'Report findings'
+    )
+}
+DEFAULT_QUEST_OBJECTIVES = ('Complete the mission',)
+
+def update_faction_ai(faction, action, target_faction=None, now=None):
     """
-    Update faction AI based on player actions
+    Update faction AI based on player actions; pass now to stamp a whole tick with one time
     """
     try:
-        # Define faction response logic
-        if action == 'help_empire':
-            if faction.faction_name == 'Galactic Empire':
-                faction.reputation += 10
-                faction.awareness += 5
-            elif faction.faction_name == 'Rebel Alliance':
-                faction.reputation -= 15
-                faction.awareness += 10
-        
-        elif action == 'help_rebels':
-            if faction.faction_name == 'Rebel Alliance':
-                faction.reputation += 10
-                faction.awareness += 5
-            elif faction.faction_name == 'Galactic Empire':
-                faction.reputation -= 15
-                faction.awareness += 10
-        
-        elif action == 'smuggling':
-            if faction.faction_name == 'Corporate Sector Authority':
-                faction.reputation -= 5
-                faction.awareness += 8
-            elif faction.faction_name == 'Galactic Empire':
-                faction.reputation -= 3
-                faction.awareness += 5
-        
-        elif action == 'bounty_hunting':
-            if faction.faction_name == 'Galactic Empire':
-                faction.reputation += 5
-                faction.awareness += 3
-        
-        elif action == 'piracy':
-            # All legitimate factions dislike piracy
-            if faction.faction_name in ['Galactic Empire', 'Rebel Alliance', 'Corporate Sector Authority']:
-                faction.reputation -= 10
-                faction.awareness += 15
-        
-        # Passive faction evolution
-        elif action == 'passive_tick':
+        # Apply the action's (reputation, awareness) effect for this faction
+        if action == 'passive_tick':
             # Factions gradually lose awareness if player is inactive
             if faction.awareness > 0:
                 faction.awareness = max(0, faction.awareness - 1)
+        else:
+            effect = FACTION_ACTION_EFFECTS.get(action, {}).get(faction.faction_name)
+            if effect:
+                faction.reputation += effect[0]
+                faction.awareness += effect[1]
         
         # Update resources based on reputation and time
         if faction.reputation > 50:
@@ -57,22 +144,22 @@ def update_faction_ai(faction, action, target_faction=None):
         elif faction.reputation < -50:
             faction.resources = max(100, faction.resources - 3)
         
-        # Update active operations based on awareness
-        operations = json.loads(faction.active_operations) if faction.active_operations else []
+        # Update active operations based on awareness; the JSON column is only
+        # reassigned (and so written) when the hunt actually starts or stops
+        operations = faction.active_operations or []
+        hunting = 'Hunt player' in operations
         
-        if faction.awareness > 70:
-            if 'Hunt player' not in operations:
-                operations.append('Hunt player')
-        elif faction.awareness < 30:
-            operations = [op for op in operations if op != 'Hunt player']
+        if faction.awareness > 70 and not hunting:
+            faction.active_operations = operations + ['Hunt player']
+        elif faction.awareness < 30 and hunting:
+            faction.active_operations = [op for op in operations if op != 'Hunt player']
         
-        faction.active_operations = json.dumps(operations)
-        faction.last_interaction = datetime.utcnow()
+        faction.last_interaction = now or datetime.utcnow()
         
         return faction
         
     except Exception as e:
-        logging.error(f"Error updating faction AI: {str(e)}")
+        logging.error("Error updating faction AI: %s", e)
         return None
 
 def calculate_faction_response(old_state, new_state):
@@ -113,68 +200,16 @@ def generate_procedural_quest(user, faction_states, quest_data=None):
         # Analyze faction states to determine quest opportunities
         high_reputation_factions = [f for f in faction_states if f.reputation > 30]
         hostile_factions = [f for f in faction_states if f.reputation < -30]
-        high_awareness_factions = [f for f in faction_states if f.awareness > 60]
-        
-        quest_templates = {
-            'delivery': {
-                'titles': [
-                    'Critical Supply Run',
-                    'Urgent Package Delivery',
-                    'Classified Transport Mission'
-                ],
-                'descriptions': [
-                    'A {faction} contact needs sensitive materials delivered to {location}.',
-                    'Transport classified cargo through {threat} territory.',
-                    'Rush delivery of medical supplies to {location}.'
-                ]
-            },
-            'rescue': {
-                'titles': [
-                    'Extraction Operation',
-                    'Rescue Mission',
-                    'Prisoner Liberation'
-                ],
-                'descriptions': [
-                    'A {faction} agent is trapped behind enemy lines.',
-                    'Extract civilians from {location} before {threat} arrives.',
-                    'Break out a political prisoner from {enemy_faction} custody.'
-                ]
-            },
-            'sabotage': {
-                'titles': [
-                    'Covert Operations',
-                    'Sabotage Mission',
-                    'Disruption Protocol'
-                ],
-                'descriptions': [
-                    'Disable {enemy_faction} communications on {location}.',
-                    'Sabotage {enemy_faction} supply lines.',
-                    'Plant surveillance devices in {enemy_faction} facilities.'
-                ]
-            },
-            'investigation': {
-                'titles': [
-                    'Intelligence Gathering',
-                    'Mystery Investigation',
-                    'Corporate Espionage'
-                ],
-                'descriptions': [
-                    'Investigate suspicious {enemy_faction} activities.',
-                    'Uncover the truth behind recent attacks on {faction} assets.',
-                    'Gather intelligence on {enemy_faction} fleet movements.'
-                ]
-            }
-        }
         
         # Select quest type based on faction relationships
         if hostile_factions and random.random() < 0.4:
-            quest_type = random.choice(['sabotage', 'investigation'])
+            quest_type = random.choice(HOSTILE_QUEST_TYPES)
         elif high_reputation_factions and random.random() < 0.5:
-            quest_type = random.choice(['delivery', 'rescue'])
+            quest_type = random.choice(FRIENDLY_QUEST_TYPES)
         else:
-            quest_type = random.choice(list(quest_templates.keys()))
+            quest_type = random.choice(QUEST_TYPES)
         
-        template = quest_templates[quest_type]
+        template = QUEST_TEMPLATES[quest_type]
         
         # Select factions for quest
         quest_giver = random.choice(high_reputation_factions) if high_reputation_factions else random.choice(faction_states)
@@ -185,7 +220,7 @@ def generate_procedural_quest(user, faction_states, quest_data=None):
         quest_description = random.choice(template['descriptions']).format(
             faction=quest_giver.faction_name,
             enemy_faction=enemy_faction.faction_name,
-            location=random.choice(['Tatooine', 'Coruscant', 'Naboo', 'Kashyyyk', 'Ryloth']),
+            location=random.choice(QUEST_LOCATIONS),
             threat=enemy_faction.faction_name
         )
         
@@ -213,7 +248,7 @@ def generate_procedural_quest(user, faction_states, quest_data=None):
         }
         
     except Exception as e:
-        logging.error(f"Error generating procedural quest: {str(e)}")
+        logging.error("Error generating procedural quest: %s", e)
         # Return a default quest
         return {
             'title': 'Routine Mission',
@@ -227,34 +262,8 @@ def generate_procedural_quest(user, faction_states, quest_data=None):
 
 def generate_quest_objectives(quest_type, faction, enemy_faction):
     """Generate appropriate objectives for quest type"""
-    objectives_map = {
-        'delivery': [
-            f'Obtain package from {faction} contact',
-            'Navigate to destination safely',
-            'Deliver package without detection',
-            'Report back to quest giver'
-        ],
-        'rescue': [
-            f'Locate {faction} agent',
-            f'Avoid {enemy_faction} patrols',
-            'Extract target safely',
-            'Escort to safe house'
-        ],
-        'sabotage': [
-            f'Infiltrate {enemy_faction} facility',
-            'Plant surveillance devices',
-            'Avoid security detection',
-            'Escape without raising alarms'
-        ],
-        'investigation': [
-            'Gather intelligence at location',
-            'Interview witnesses',
-            'Analyze collected data',
-            'Report findings'
-        ]
-    }
-    
-    return objectives_map.get(quest_type, ['Complete the mission'])
+    templates = QUEST_OBJECTIVES.get(quest_type, DEFAULT_QUEST_OBJECTIVES)
+    return [objective.format(faction=faction, enemy_faction=enemy_faction) for objective in templates]
 
 def generate_quest_rewards(quest_type, faction_reputation):
     """Generate appropriate rewards based on quest type and faction standing"""
@@ -272,14 +281,7 @@ def generate_quest_rewards(quest_type, faction_reputation):
         rewards.append('Faction reputation +10')
     
     if random.random() < 0.3:
-        equipment_rewards = [
-            'Upgraded blaster',
-            'Advanced comlink',
-            'Stealth field generator',
-            'Medical supplies',
-            'Ship upgrade components'
-        ]
-        rewards.append(random.choice(equipment_rewards))
+        rewards.append(random.choice(EQUIPMENT_REWARDS))
     
     if quest_type == 'rescue' and random.random() < 0.4:
         rewards.append('New ally contact')
@@ -288,14 +290,10 @@ def generate_quest_rewards(quest_type, faction_reputation):
 
 def calculate_galaxy_momentum(faction_states):
     """Calculate overall galaxy momentum based on faction activities"""
-    total_momentum = 0
-    
-    for faction in faction_states:
-        # High awareness and extreme reputation contribute to momentum
-        momentum_contribution = faction.awareness
-        if abs(faction.reputation) > 60:
-            momentum_contribution += 20
-        
-        total_momentum += momentum_contribution
+    # High awareness and extreme reputation contribute to momentum
+    total_momentum = sum(
+        faction.awareness + (20 if abs(faction.reputation) > 60 else 0)
+        for faction in faction_states
+    )
     
     return min(100, total_momentum)
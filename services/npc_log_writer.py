@@ -0,0 +1,106 @@
+"""
+NPC Interaction Log Writer
+Background batching writer that keeps NPC interaction inserts off the dialogue request path
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+from flask import current_app
+from app import db
+from models import NPCInteraction
+
+BATCH_SIZE = int(os.environ.get('NPC_LOG_BATCH_SIZE', '500'))
+FLUSH_INTERVAL = float(os.environ.get('NPC_LOG_FLUSH_SECONDS', '1.0'))
+
+_queue = queue.Queue(maxsize=BATCH_SIZE * 20)
+_stop = object()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _insert(rows: List[Dict]) -> bool:
+    try:
+        db.session.execute(NPCInteraction.__table__.insert(), rows)
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logging.warning("Failed to log %d NPC interactions: %s", len(rows), e)
+        return False
+
+
+def _write_batch(app, rows: List[Dict]):
+    with app.app_context():
+        try:
+            if _insert(rows) or len(rows) == 1:
+                return
+            # One bad row rolls back the whole executemany; retry each so only bad rows are lost
+            dropped = sum(not _insert([row]) for row in rows)
+            logging.warning("Dropped %d of %d NPC interactions from a failed batch", dropped, len(rows))
+        finally:
+            db.session.remove()
+
+
+def _run(app):
+    while True:
+        item = _queue.get()
+        if item is _stop:
+            return
+        
+        rows = [item]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        stopping = False
+        while len(rows) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _stop:
+                stopping = True
+                break
+            rows.append(item)
+        
+        _write_batch(app, rows)
+        if stopping:
+            return
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run,
+                args=(current_app._get_current_object(),),
+                name='npc-log-writer',
+                daemon=True
+            )
+            _worker.start()
+
+
+def log_interaction(**fields):
+    """Queue an NPC interaction row; dropped with a warning if the writer is saturated"""
+    fields.setdefault('timestamp', datetime.utcnow())
+    _ensure_worker()
+    try:
+        _queue.put_nowait(fields)
+    except queue.Full:
+        logging.warning("NPC interaction log queue full; dropping interaction")
+
+
+@atexit.register
+def flush():
+    """Write out queued interactions before the process exits"""
+    if _worker is not None and _worker.is_alive():
+        _queue.put(_stop)
+        _worker.join(timeout=FLUSH_INTERVAL + 5)
@@ -1,15 +1,54 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import os
 import logging
-import json
+import hashlib
+import functools
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import MappingProxyType
+from services import cache_service
+from utils import fastjson
 
 NVIDIA_API_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
+PROMPT_CACHE_TTL = int(os.getenv("NEMOTRON_CACHE_TTL", "3600"))
+BATCH_CONCURRENCY = int(os.getenv("NEMOTRON_BATCH_CONCURRENCY", "16"))
+# Streamed deltas are coalesced into chunks of up to this many tokens (or to a newline)
+STREAM_FLUSH_TOKENS = 8
 
 # Remove any quotes that might be around the API key
 if NVIDIA_API_KEY:
     NVIDIA_API_KEY = NVIDIA_API_KEY.strip().strip('"').strip("'")
 
+# One keep-alive connection pool per worker so calls skip the TCP and TLS handshake
+_session = requests.Session()
+# Gateway errors and failed connects are retried briefly; read timeouts are not, since a
+# slow completion would otherwise hold the caller for several 30s timeouts
+_retry = Retry(
+    total=2,
+    read=0,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"POST"}),
+    raise_on_status=False
+)
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=_retry))
+_session.headers.update({
+    "Authorization": f"Bearer {NVIDIA_API_KEY}",
+    "Accept": "application/json",
+    "Content-Type": "application/json"
+})
+
+# Multi-NPC requests fan out here; capped so one scene can't exhaust the connection pool
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="nemotron-batch")
+
+# Cache misses currently being fetched, so concurrent identical prompts in a worker share one call
+_inflight = {}
+_inflight_lock = threading.Lock()
+
 def query_nemotron_api(system_message, user_message, model="nvidia/nemotron-mini-4b-instruct"):
     """
     Query NVIDIA Nemotron API for NPC dialogue generation using direct requests
@@ -19,12 +58,6 @@ def query_nemotron_api(system_message, user_message, model="nvidia/nemotron-mini
             logging.error("NVIDIA API key missing")
             return get_fallback_response(system_message, user_message)
         
-        headers = {
-            "Authorization": f"Bearer {NVIDIA_API_KEY}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": model,
             "messages": [
@@ -37,49 +70,103 @@ def query_nemotron_api(system_message, user_message, model="nvidia/nemotron-mini
             "stream": False
         }
         
-        response = requests.post(NVIDIA_API_URL, headers=headers, json=payload, timeout=30)
+        # Session headers already carry Content-Type: application/json
+        response = _session.post(NVIDIA_API_URL, data=fastjson.dumps_bytes(payload), timeout=30)
         
         if response.status_code == 200:
-            return response.json()
+            return fastjson.loads(response.content)
         else:
-            logging.error(f"NVIDIA API error: {response.status_code} - {response.text}")
+            logging.error("NVIDIA API error: %s - %s", response.status_code, response.text)
             return get_fallback_response(system_message, user_message)
         
     except requests.exceptions.RequestException as e:
-        logging.error(f"Request error calling NVIDIA API: {str(e)}")
+        logging.error("Request error calling NVIDIA API: %s", e)
         return get_fallback_response(system_message, user_message)
     except Exception as e:
-        logging.error(f"Unexpected error calling NVIDIA API: {str(e)}")
+        logging.error("Unexpected error calling NVIDIA API: %s", e)
         return get_fallback_response(system_message, user_message)
 
+# Case, spacing and trailing punctuation don't change what a player asked an NPC
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?,;:~]+$")
+
+def _normalize_prompt(user_message):
+    """Collapse cosmetic differences in a player message so near-identical lines share a cache entry"""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(user_message.split()).casefold())
+
+def cached_nemotron(system_message, user_message, model="nvidia/nemotron-mini-4b-instruct", ttl=None):
+    """
+    Query Nemotron through a prompt cache keyed on the normalized player message;
+    fallback responses are never cached
+    """
+    cache_text = f"{model}\x00{system_message}\x00{_normalize_prompt(user_message)}"
+    digest = hashlib.blake2b(cache_text.encode('utf-8'), digest_size=16).hexdigest()
+    cache_key = f"nemotron:{digest}"
+    
+    cached = cache_service.get_json(cache_key)
+    if cached is not None:
+        return cached
+    
+    with _inflight_lock:
+        pending = _inflight.get(cache_key)
+        if pending is None:
+            pending = _inflight[cache_key] = Future()
+            leader = True
+        else:
+            leader = False
+    if not leader:
+        return pending.result()
+    
+    try:
+        response_data = query_nemotron_api(system_message, user_message, model=model)
+        if response_data and response_data.get("id") != "galaxy-fallback":
+            cache_service.set_json(cache_key, response_data, ttl or PROMPT_CACHE_TTL)
+        pending.set_result(response_data)
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[cache_key]
+    
+    return response_data
+
+def query_nemotron_batch(prompts, model="nvidia/nemotron-mini-4b-instruct"):
+    """
+    Run several (system_message, user_message) prompts concurrently through the prompt cache;
+    results come back in prompt order
+    """
+    if len(prompts) <= 1:
+        return [cached_nemotron(system_message, user_message, model=model) for system_message, user_message in prompts]
+    return list(_batch_executor.map(
+        lambda prompt: cached_nemotron(prompt[0], prompt[1], model=model),
+        prompts
+    ))
+
+# Fallback line per NPC type, in detection priority order; {message} is the player's message
+FALLBACK_RESPONSES = MappingProxyType({
+    'jedi': "*Speaks with quiet wisdom* The Force guides us all, young one. Your question about '{message}' shows you seek understanding. Remember - patience and meditation will reveal the answers you seek.",
+    'sith': "*Eyes gleaming with dark power* You dare question me about '{message}'? Power is the only truth that matters in this galaxy. Weakness will be your downfall.",
+    'imperial': "*Adjusts uniform with military precision* Citizen, your inquiry regarding '{message}' has been noted. The Empire maintains order through strength and discipline.",
+    'rebel': "*Leans in conspiratorially* What you ask about '{message}' touches on dangerous matters. The fight for freedom requires sacrifice and courage.",
+    'smuggler': "*Grins slyly* Listen, friend, about '{message}' - in my line of work, you learn to ask few questions and keep your mouth shut. Credits talk louder than words.",
+    'droid': "*Mechanical voice* QUERY PROCESSED: '{message}'. RESPONSE: My programming indicates this requires further analysis. Probability of success: 73.6%.",
+    'civilian': "*Nervous glance around* I don't know much about '{message}', stranger. These are dangerous times. Best to keep your head down and stay out of trouble."
+})
+
 def get_fallback_response(system_message, user_message):
     """
     Generate Star Wars RPG fallback responses when NVIDIA API is unavailable
     """
-    # Create contextual Star Wars responses based on NPC type and message
-    fallback_responses = {
-        'jedi': f"*Speaks with quiet wisdom* The Force guides us all, young one. Your question about '{user_message}' shows you seek understanding. Remember - patience and meditation will reveal the answers you seek.",
-        'sith': f"*Eyes gleaming with dark power* You dare question me about '{user_message}'? Power is the only truth that matters in this galaxy. Weakness will be your downfall.",
-        'imperial': f"*Adjusts uniform with military precision* Citizen, your inquiry regarding '{user_message}' has been noted. The Empire maintains order through strength and discipline.",
-        'rebel': f"*Leans in conspiratorially* What you ask about '{user_message}' touches on dangerous matters. The fight for freedom requires sacrifice and courage.",
-        'smuggler': f"*Grins slyly* Listen, friend, about '{user_message}' - in my line of work, you learn to ask few questions and keep your mouth shut. Credits talk louder than words.",
-        'droid': f"*Mechanical voice* QUERY PROCESSED: '{user_message}'. RESPONSE: My programming indicates this requires further analysis. Probability of success: 73.6%.",
-        'civilian': f"*Nervous glance around* I don't know much about '{user_message}', stranger. These are dangerous times. Best to keep your head down and stay out of trouble."
-    }
-    
-    # Determine NPC type from system message
-    npc_type = 'civilian'
-    for key in fallback_responses.keys():
-        if key in system_message.lower():
-            npc_type = key
-            break
+    # Determine NPC type from system message: first type, in priority order, mentioned anywhere
+    lowered = system_message.lower()
+    npc_type = next((key for key in FALLBACK_RESPONSES if key in lowered), 'civilian')
     
     return {
         "id": "galaxy-fallback",
         "choices": [{
             "message": {
                 "role": "assistant",
-                "content": fallback_responses[npc_type]
+                "content": FALLBACK_RESPONSES[npc_type].format(message=user_message)
             }
         }]
     }
@@ -93,12 +180,6 @@ def query_nemotron_streaming(system_message, user_message, model="nvidia/nemotro
             logging.error("NVIDIA API key missing")
             return None
         
-        headers = {
-            "Authorization": f"Bearer {NVIDIA_API_KEY}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": model,
             "messages": [
@@ -111,39 +192,89 @@ def query_nemotron_streaming(system_message, user_message, model="nvidia/nemotro
             "stream": True
         }
         
-        response = requests.post(NVIDIA_API_URL, headers=headers, json=payload, stream=True, timeout=30)
+        response = _session.post(NVIDIA_API_URL, data=fastjson.dumps_bytes(payload), stream=True, timeout=30)
         
         if response.status_code == 200:
             return response
         else:
-            logging.error(f"NVIDIA streaming API error: {response.status_code} - {response.text}")
+            logging.error("NVIDIA streaming API error: %s - %s", response.status_code, response.text)
             return None
         
     except requests.exceptions.RequestException as e:
-        logging.error(f"Request error calling NVIDIA streaming API: {str(e)}")
+        logging.error("Request error calling NVIDIA streaming API: %s", e)
         return None
     except Exception as e:
-        logging.error(f"Unexpected error calling NVIDIA streaming API: {str(e)}")
+        logging.error("Unexpected error calling NVIDIA streaming API: %s", e)
         return None
 
+def stream_nemotron_tokens(system_message, user_message, model="nvidia/nemotron-mini-4b-instruct"):
+    """
+    Yield completion text as Nemotron produces it, a few tokens per chunk so clients see fewer writes;
+    a single fallback line if the stream can't open
+    """
+    response = query_nemotron_streaming(system_message, user_message, model=model)
+    if response is None:
+        yield get_fallback_response(system_message, user_message)["choices"][0]["message"]["content"]
+        return
+    
+    # The first token goes out alone to keep time-to-first-byte low
+    buffer = None
+    with response:
+        try:
+            for line in response.iter_lines():
+                # Server-sent events: one JSON chunk per "data: " line, terminated by [DONE]
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    break
+                try:
+                    chunk = fastjson.loads(data)
+                except ValueError:
+                    continue
+                choices = chunk.get("choices")
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if not content:
+                        continue
+                    if buffer is None:
+                        buffer = []
+                        yield content
+                        continue
+                    buffer.append(content)
+                    if len(buffer) >= STREAM_FLUSH_TOKENS or "\n" in content:
+                        yield "".join(buffer)
+                        buffer.clear()
+        except requests.exceptions.RequestException as e:
+            logging.error("Stream interrupted from NVIDIA streaming API: %s", e)
+    
+    if buffer:
+        yield "".join(buffer)
+
+# Persona template per NPC type; {name} is filled per call
+NPC_CONTEXT_TEMPLATES = MappingProxyType({
+    'jedi': "You are {name}, a Jedi Knight dedicated to peace and justice. You speak with wisdom and compassion, always seeking to help others and maintain balance in the Force.",
+    'sith': "You are {name}, a Sith Lord driven by power and ambition. You speak with authority and menace, seeing weakness as an opportunity to exploit.",
+    'imperial': "You are {name}, an Imperial officer loyal to the Empire. You speak with military precision and unwavering dedication to Imperial order.",
+    'rebel': "You are {name}, a member of the Rebel Alliance fighting against Imperial tyranny. You speak with passion for freedom and justice.",
+    'smuggler': "You are {name}, a smuggler operating in the galaxy's underworld. You speak with casual confidence and street-smart awareness.",
+    'bounty_hunter': "You are {name}, a bounty hunter who works for the highest bidder. You speak with professional detachment and calculating precision.",
+    'merchant': "You are {name}, a merchant trying to make an honest living in a dangerous galaxy. You speak with commercial enthusiasm and practical wisdom.",
+    'civilian': "You are {name}, an ordinary citizen trying to survive in a galaxy torn by conflict. You speak with common sense and everyday concerns.",
+    'droid': "You are {name}, a droid programmed for specific functions. You speak with logical precision and occasional quirks based on your programming.",
+    'crime_lord': "You are {name}, a powerful crime lord who controls criminal enterprises. You speak with calculated menace and business acumen."
+})
+
 def generate_npc_context(npc_name, npc_type, location="Unknown", faction_affiliation="Neutral"):
     """
     Generate appropriate context for NPC dialogue based on Star Wars lore
     """
-    contexts = {
-        'jedi': f"You are {npc_name}, a Jedi Knight dedicated to peace and justice. You speak with wisdom and compassion, always seeking to help others and maintain balance in the Force.",
-        'sith': f"You are {npc_name}, a Sith Lord driven by power and ambition. You speak with authority and menace, seeing weakness as an opportunity to exploit.",
-        'imperial': f"You are {npc_name}, an Imperial officer loyal to the Empire. You speak with military precision and unwavering dedication to Imperial order.",
-        'rebel': f"You are {npc_name}, a member of the Rebel Alliance fighting against Imperial tyranny. You speak with passion for freedom and justice.",
-        'smuggler': f"You are {npc_name}, a smuggler operating in the galaxy's underworld. You speak with casual confidence and street-smart awareness.",
-        'bounty_hunter': f"You are {npc_name}, a bounty hunter who works for the highest bidder. You speak with professional detachment and calculating precision.",
-        'merchant': f"You are {npc_name}, a merchant trying to make an honest living in a dangerous galaxy. You speak with commercial enthusiasm and practical wisdom.",
-        'civilian': f"You are {npc_name}, an ordinary citizen trying to survive in a galaxy torn by conflict. You speak with common sense and everyday concerns.",
-        'droid': f"You are {npc_name}, a droid programmed for specific functions. You speak with logical precision and occasional quirks based on your programming.",
-        'crime_lord': f"You are {npc_name}, a powerful crime lord who controls criminal enterprises. You speak with calculated menace and business acumen."
-    }
-    
-    base_context = contexts.get(npc_type.lower(), contexts['civilian'])
+    return _npc_context(npc_name, npc_type.lower(), location, faction_affiliation)
+
+@functools.lru_cache(maxsize=4096)
+def _npc_context(npc_name, npc_type, location, faction_affiliation):
+    # Only the matching template is formatted; repeat NPCs are served from the cache
+    base_context = NPC_CONTEXT_TEMPLATES.get(npc_type, NPC_CONTEXT_TEMPLATES['civilian']).format(name=npc_name)
     
     if location != "Unknown":
         base_context += f" You are currently on {location}."
@@ -177,5 +308,5 @@ def test_nvidia_connection():
             return False
             
     except Exception as e:
-        logging.error(f"Error testing NVIDIA connection: {str(e)}")
+        logging.error("Error testing NVIDIA connection: %s", e)
         return False
@@ -4,9 +4,10 @@ Creates dynamic, faction-aware quests with branching narratives and consequences
 """
 import random
 import uuid
+from itertools import combinations
 from datetime import datetime
-from typing import Dict, List, Any
-from services.nvidia_service import query_nemotron_api
+from typing import Dict, List, Any, Tuple
+from services.nvidia_service import cached_nemotron
 
 class ProceduralQuestEngine:
     def __init__(self):
@@ -33,26 +34,42 @@ class ProceduralQuestEngine:
             "npcs": ["Imperial Officer", "Rebel Spy", "Smuggler", "Jedi Survivor", "Sith Apprentice", "Corporate Executive", "Bounty Hunter", "Force Sensitive"],
             "complications": ["Imperial ambush", "Betrayal by ally", "Force vision", "Equipment failure", "Innocent bystanders", "Time pressure", "Moral choice"]
         }
+        
+        # Title pattern and filler words per quest type
+        self.title_patterns = {
+            "faction_conflict": ("Shadow War: {} Conspiracy", ("Imperial", "Rebel", "Corporate")),
+            "force_awakening": ("Force Echoes: {} Legacy", ("Ancient", "Dark", "Lost")),
+            "galactic_mystery": ("Deep Space: {} Truth", ("Missing", "Hidden", "Forgotten"))
+        }
     
     def generate_adaptive_quest(self, user: str, faction_states: Dict, player_history: List[Dict], force_alignment: Dict) -> Dict:
         """Generate a quest that adapts to current galaxy state and player choices"""
+        quest, enhanced_quest = self.build_adaptive_quest(user, faction_states, player_history, force_alignment)
+        quest["description"] = self.narrate_quest(enhanced_quest)
+        return quest
+    
+    def build_adaptive_quest(self, user: str, faction_states: Dict, player_history: List[Dict], force_alignment: Dict) -> Tuple[Dict, Dict]:
+        """Build the quest locally with a placeholder description; returns the quest and the input for narrate_quest"""
         
         # Analyze player history for quest personalization
         player_profile = self._analyze_player_profile(player_history, force_alignment)
         
+        # Total faction tension drives quest type, tension level and difficulty; sum it once
+        galaxy_tension = sum(abs(f.get("reputation", 0)) for f in faction_states.values())
+        
         # Select quest type based on current faction tensions
-        quest_type = self._select_quest_type(faction_states, player_profile)
+        quest_type = self._select_quest_type(galaxy_tension, player_profile)
         
         # Generate core quest structure
         base_quest = self._generate_base_quest(quest_type, faction_states)
         
         # Add dynamic elements and branching paths
-        enhanced_quest = self._enhance_with_dynamics(base_quest, player_profile, faction_states)
+        enhanced_quest = self._enhance_with_dynamics(base_quest, player_profile, faction_states, galaxy_tension)
         
-        # Generate AI-powered narrative description
-        narrative = self._generate_quest_narrative(enhanced_quest, faction_states)
+        # The AI narrative is a network round-trip, so it is left to narrate_quest
+        narrative = self._initial_narrative(enhanced_quest)
         
-        return {
+        quest = {
             "id": str(uuid.uuid4()),
             "user": user,
             "quest_title": enhanced_quest["title"],
@@ -64,13 +81,14 @@ class ProceduralQuestEngine:
             "faction_involvement": enhanced_quest["factions"],
             "force_implications": enhanced_quest.get("force_impact", {}),
             "adaptive_elements": enhanced_quest["adaptive_elements"],
-            "difficulty": self._calculate_dynamic_difficulty(player_profile, faction_states),
+            "difficulty": self._calculate_dynamic_difficulty(player_profile, galaxy_tension),
             "rewards": self._generate_adaptive_rewards(enhanced_quest, player_profile),
             "status": "active",
             "created_at": datetime.utcnow().isoformat(),
             "completed_at": None,
             "narrative_state": narrative["state_tracking"]
         }
+        return quest, enhanced_quest
     
     def _analyze_player_profile(self, history: List[Dict], force_alignment: Dict) -> Dict:
         """Analyze player choices to create adaptive quest profile"""
@@ -105,15 +123,10 @@ class ProceduralQuestEngine:
         
         return profile
     
-    def _select_quest_type(self, faction_states: Dict, player_profile: Dict) -> str:
+    def _select_quest_type(self, galaxy_tension: float, player_profile: Dict) -> str:
         """Select quest type based on galaxy state and player profile"""
-        # Calculate faction tension levels
-        total_tension = 0
-        for faction in faction_states.values():
-            total_tension += abs(faction.get("reputation", 0))
-        
         # High faction tension = more conflict quests
-        if total_tension > 150:
+        if galaxy_tension > 150:
             return "faction_conflict"
         
         # High Force sensitivity = more Force quests
@@ -143,17 +156,12 @@ class ProceduralQuestEngine:
             "moral_dilemmas": template["moral_dilemmas"]
         }
     
-    def _enhance_with_dynamics(self, base_quest: Dict, player_profile: Dict, faction_states: Dict) -> Dict:
+    def _enhance_with_dynamics(self, base_quest: Dict, player_profile: Dict, faction_states: Dict, galaxy_tension: float) -> Dict:
         """Add dynamic elements and personalization"""
-        # Generate quest title based on type and factions
-        title_generators = {
-            "faction_conflict": f"Shadow War: {random.choice(['Imperial', 'Rebel', 'Corporate'])} Conspiracy",
-            "force_awakening": f"Force Echoes: {random.choice(['Ancient', 'Dark', 'Lost'])} Legacy",
-            "galactic_mystery": f"Deep Space: {random.choice(['Missing', 'Hidden', 'Forgotten'])} Truth"
-        }
-        
+        # Generate quest title based on type; only the matching pattern is filled
         enhanced = base_quest.copy()
-        enhanced["title"] = title_generators.get(base_quest["type"], "Galaxy Quest")
+        title_pattern = self.title_patterns.get(base_quest["type"])
+        enhanced["title"] = title_pattern[0].format(random.choice(title_pattern[1])) if title_pattern else "Galaxy Quest"
         
         # Add specific objectives based on primary objective
         objectives = [base_quest["primary_objective"].replace("_", " ").title()]
@@ -188,27 +196,33 @@ class ProceduralQuestEngine:
             "location": random.choice(self.dynamic_elements["locations"]),
             "key_npc": random.choice(self.dynamic_elements["npcs"]),
             "complication": random.choice(self.dynamic_elements["complications"]),
-            "faction_tension_level": sum(abs(f.get("reputation", 0)) for f in faction_states.values()) / len(faction_states)
+            "faction_tension_level": galaxy_tension / len(faction_states)
         }
         
         return enhanced
     
-    def _generate_quest_narrative(self, quest: Dict, faction_states: Dict) -> Dict:
+    def narrate_quest(self, quest: Dict) -> str:
         """Generate AI-powered narrative description"""
-        quest_context = f"Quest type: {quest['type']}, Factions: {', '.join(quest['factions'])}, Location: {quest['adaptive_elements']['location']}"
+        # Factions are sorted and the most-reused fields lead, so equivalent quests produce
+        # byte-identical prompts for our prompt cache and the provider's prefix cache
+        quest_context = f"Quest type: {quest['type']}, Location: {quest['adaptive_elements']['location']}, Factions: {', '.join(sorted(quest['factions']))}"
         
-        ai_response = query_nemotron_api(
+        # Quest templates recur, so identical narrator prompts are served from the prompt cache
+        ai_response = cached_nemotron(
             "You are a Star Wars quest narrator. Create an engaging quest description that sets up the scenario, explains the stakes, and hints at deeper consequences.",
-            f"Create a compelling quest narrative for: {quest['title']}. Context: {quest_context}. Primary objective: {quest['primary_objective']}",
+            f"Create a compelling quest narrative. Context: {quest_context}. Primary objective: {quest['primary_objective']}. Title: {quest['title']}",
             "nvidia/nemotron-mini-4b-instruct"
         )
         
-        description = f"A new challenge emerges in the {quest['adaptive_elements']['location']} system involving {', '.join(quest['factions'])}."
         if ai_response and ai_response.get("choices"):
-            description = ai_response["choices"][0]["message"]["content"]
+            return ai_response["choices"][0]["message"]["content"]
         
+        return self._initial_narrative(quest)["description"]
+    
+    def _initial_narrative(self, quest: Dict) -> Dict:
+        """Local placeholder description and fresh narrative tracking state"""
         return {
-            "description": description,
+            "description": f"A new challenge emerges in the {quest['adaptive_elements']['location']} system involving {', '.join(quest['factions'])}.",
             "state_tracking": {
                 "current_phase": "initial",
                 "completed_objectives": [],
@@ -219,29 +233,25 @@ class ProceduralQuestEngine:
     
     def _select_quest_factions(self, faction_states: Dict) -> List[str]:
         """Select factions involved in quest based on current relationships"""
-        # Find factions with highest tension
-        faction_tensions = []
         faction_names = list(faction_states.keys())
+        reputations = [faction_states[name].get("reputation", 0) for name in faction_names]
         
-        for i, faction1 in enumerate(faction_names):
-            for faction2 in faction_names[i+1:]:
-                tension = abs(faction_states[faction1].get("reputation", 0) - faction_states[faction2].get("reputation", 0))
-                faction_tensions.append((tension, faction1, faction2))
-        
-        # Select the most tension-filled faction pair
-        if faction_tensions:
-            faction_tensions.sort(reverse=True)
-            return [faction_tensions[0][1], faction_tensions[0][2]]
+        # Select the most tension-filled faction pair in one pass; only the top pair is used
+        if len(faction_names) > 1:
+            _, faction1, faction2 = max(
+                (abs(rep1 - rep2), faction1, faction2)
+                for (faction1, rep1), (faction2, rep2) in combinations(zip(faction_names, reputations), 2)
+            )
+            return [faction1, faction2]
         
         # Fallback to random selection
         return random.sample(faction_names, min(2, len(faction_names)))
     
-    def _calculate_dynamic_difficulty(self, player_profile: Dict, faction_states: Dict) -> str:
+    def _calculate_dynamic_difficulty(self, player_profile: Dict, galaxy_tension: float) -> str:
         """Calculate quest difficulty based on player experience and galaxy state"""
         base_difficulty = player_profile.get("completed_quests", 0)
-        galaxy_tension = sum(abs(f.get("reputation", 0)) for f in faction_states.values()) / 100
         
-        total_difficulty = base_difficulty + galaxy_tension
+        total_difficulty = base_difficulty + galaxy_tension / 100
         
         if total_difficulty < 5:
             return "Easy"
@@ -2,14 +2,43 @@
 Multiplayer Session State Management System
 Handles persistent game world state across multiple players and sessions
 """
-import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
-from services.nvidia_service import query_nemotron_api
+from types import MappingProxyType
+from services.nvidia_service import cached_nemotron, query_nemotron_api
 
-@dataclass
+# Seconds an identical session summary prompt reuses the previous narration
+SESSION_SUMMARY_TTL = 300
+# Events kept per session; only the most recent few are ever read back
+SESSION_EVENT_LIMIT = 256
+# Actions granting more experience than this count as major: they make global events and get AI narration
+MAJOR_ACTION_EXPERIENCE = 40
+
+# Era a new session starts in, pre-formatted as its galaxy timestamp
+GALAXY_ERAS = tuple(f"Galactic Standard Calendar: {era}" for era in (
+    "25 ABY - New Jedi Order Era",
+    "4 ABY - New Republic Era",
+    "0 BBY - Rebellion Era",
+    "19 BBY - Dark Times",
+    "22 BBY - Clone Wars"
+))
+# Starting territory per faction; each session gets its own mutable copy
+INITIAL_FACTION_TERRITORIES = MappingProxyType({
+    "Empire": ("Coruscant", "Kuat", "Fondor", "Carida"),
+    "Rebellion": ("Mon Cala", "Chandrila", "Ryloth", "Onderon"),
+    "Corporate": ("Sullust", "Sluis Van", "Bothawui", "Malastare"),
+    "Neutral": ("Tatooine", "Dagobah", "Hoth", "Kashyyyk")
+})
+# Days per unit accepted in advance_session_time increments such as "3 days" or "1 week"
+TIME_UNIT_DAYS = MappingProxyType({"day": 1, "week": 7, "month": 30, "year": 368})
+# Off-screen activity a faction may pursue while session time passes
+BACKGROUND_FACTION_ACTIVITIES = ("consolidation", "expansion", "espionage", "recruitment", "retreat")
+
+@dataclass(slots=True)
 class PlayerState:
     user_id: str
     character_name: str
@@ -22,7 +51,7 @@ class PlayerState:
     session_join_time: str
     last_action_time: str
 
-@dataclass 
+@dataclass(slots=True)
 class SessionWorldState:
     session_id: str
     galaxy_timestamp: str
@@ -38,7 +67,9 @@ class MultplayerSessionManager:
     def __init__(self):
         self.active_sessions: Dict[str, SessionWorldState] = {}
         self.player_sessions: Dict[str, str] = {}  # player_id -> session_id
-        self.session_events: Dict[str, List[Dict]] = {}
+        self.session_players: Dict[str, Dict[str, None]] = {}  # session_id -> player_ids, as an insertion-ordered set
+        self.session_events: Dict[str, Deque[Dict]] = {}
+        self._state_snapshots: Dict[str, Tuple[str, Dict]] = {}  # session_id -> (last_updated, asdict snapshot)
         
         # Cross-session galaxy state tracking
         self.global_galaxy_state = {
@@ -53,6 +84,7 @@ class MultplayerSessionManager:
         
         # Generate initial galaxy state for this session
         galaxy_timestamp = self._generate_galaxy_timestamp()
+        now = datetime.utcnow().isoformat()
         
         world_state = SessionWorldState(
             session_id=session_id,
@@ -62,18 +94,19 @@ class MultplayerSessionManager:
             global_events=[],
             shared_narrative=[],
             session_master=session_master,
-            created_at=datetime.utcnow().isoformat(),
-            last_updated=datetime.utcnow().isoformat()
+            created_at=now,
+            last_updated=now
         )
         
         self.active_sessions[session_id] = world_state
-        self.session_events[session_id] = []
+        self.session_events[session_id] = deque(maxlen=SESSION_EVENT_LIMIT)
+        self.session_players.setdefault(session_id, {})
         
         # Add session creation to global galaxy state
         self.global_galaxy_state["major_events"].append({
             "type": "session_created",
             "session_id": session_id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now,
             "description": f"New campaign begins in {galaxy_timestamp} era"
         })
         
@@ -86,6 +119,8 @@ class MultplayerSessionManager:
         if session_id not in self.active_sessions:
             raise ValueError(f"Session {session_id} does not exist")
         
+        now = datetime.utcnow().isoformat()
+        
         # Create player state within session context
         player_state = PlayerState(
             user_id=player_id,
@@ -96,29 +131,40 @@ class MultplayerSessionManager:
             active_quests=[],
             inventory=character_data.get("inventory", []),
             experience_points=character_data.get("experience", 0),
-            session_join_time=datetime.utcnow().isoformat(),
-            last_action_time=datetime.utcnow().isoformat()
+            session_join_time=now,
+            last_action_time=now
         )
         
-        # Link player to session
-        self.player_sessions[player_id] = session_id
-        
         # Broadcast player join to session
         join_event = {
             "type": "player_joined",
             "player_id": player_id,
             "character_name": player_state.character_name,
             "location": player_state.location,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now,
             "narrative_impact": f"{player_state.character_name} emerges in the galaxy during troubled times"
         }
         
         self.session_events[session_id].append(join_event)
         self._update_session_timestamp(session_id)
         
+        # Link player to session, moving them out of any previous one
+        previous_session = self.player_sessions.get(player_id)
+        if previous_session and previous_session != session_id:
+            self.session_players.get(previous_session, {}).pop(player_id, None)
+        self.player_sessions[player_id] = session_id
+        self.session_players.setdefault(session_id, {})[player_id] = None
+        
         logging.info(f"Player {player_id} joined session {session_id} as {player_state.character_name}")
         return player_state
     
+    def leave_session(self, player_id: str) -> Optional[str]:
+        """Unlink a player from their session; returns the session they left, if any"""
+        session_id = self.player_sessions.pop(player_id, None)
+        if session_id:
+            self.session_players.get(session_id, {}).pop(player_id, None)
+        return session_id
+    
     def process_player_action(self, player_id: str, action: Dict) -> Dict:
         """Process player action with full session state awareness"""
         
@@ -137,15 +183,18 @@ class MultplayerSessionManager:
         # Update session world state
         self._update_world_state(session_id, action, action_result, ripple_effects)
         
-        # Generate narrative consequences
-        narrative_update = self._generate_action_narrative(session_id, player_id, action, action_result)
+        # Generate narrative consequences; minor actions that touch no one else skip the AI round-trip
+        if action_result.get("experience_gained", 0) > MAJOR_ACTION_EXPERIENCE or ripple_effects:
+            narrative_update = self._generate_action_narrative(session_id, player_id, action, action_result)
+        else:
+            narrative_update = self._default_action_narrative(player_id)
         
         return {
             "action_result": action_result,
             "ripple_effects": ripple_effects,
             "narrative_update": narrative_update,
-            "updated_world_state": asdict(session_state),
-            "session_events": self.session_events[session_id][-5:]  # Last 5 events
+            "updated_world_state": self._state_snapshot(session_state),
+            "session_events": self._recent_events(session_id, 5)  # Last 5 events
         }
     
     def sync_session_state(self, session_id: str) -> Dict:
@@ -157,7 +206,7 @@ class MultplayerSessionManager:
         session_state = self.active_sessions[session_id]
         
         # Get all players in this session
-        session_players = [pid for pid, sid in self.player_sessions.items() if sid == session_id]
+        session_players = list(self.session_players.get(session_id, ()))
         
         # Calculate current faction balance
         current_balance = self._calculate_session_faction_balance(session_id)
@@ -166,10 +215,10 @@ class MultplayerSessionManager:
         session_summary = self._generate_session_summary(session_id)
         
         return {
-            "session_state": asdict(session_state),
+            "session_state": self._state_snapshot(session_state),
             "active_players": session_players,
             "faction_balance": current_balance,
-            "recent_events": self.session_events[session_id][-10:],
+            "recent_events": self._recent_events(session_id, 10),
             "session_summary": session_summary,
             "global_galaxy_influence": self._calculate_global_influence(session_id)
         }
@@ -181,18 +230,20 @@ class MultplayerSessionManager:
             raise ValueError(f"Session {session_id} does not exist")
         
         session_state = self.active_sessions[session_id]
+        days = self._increment_days(time_increment)
         
         # Process faction AI turns during time advancement
         faction_changes = {}
         for faction in ["Empire", "Rebellion", "Corporate"]:
-            faction_changes[faction] = self._process_background_faction_activity(session_id, faction, time_increment)
+            faction_changes[faction] = self._process_background_faction_activity(session_id, faction, days)
         
         # Generate random galaxy events
-        galaxy_events = self._generate_time_passage_events(session_id, time_increment)
+        galaxy_events = self._generate_time_passage_events(session_id, days)
         
         # Update session timestamp
-        session_state.galaxy_timestamp = self._advance_galaxy_timestamp(session_state.galaxy_timestamp, time_increment)
-        session_state.last_updated = datetime.utcnow().isoformat()
+        session_state.galaxy_timestamp = self._advance_galaxy_timestamp(session_state.galaxy_timestamp, days)
+        now = datetime.utcnow().isoformat()
+        session_state.last_updated = now
         
         # Add time passage event
         time_event = {
@@ -200,7 +251,7 @@ class MultplayerSessionManager:
             "increment": time_increment,
             "faction_changes": faction_changes,
             "galaxy_events": galaxy_events,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now
         }
         
         self.session_events[session_id].append(time_event)
@@ -212,16 +263,78 @@ class MultplayerSessionManager:
             "narrative_summary": f"Time passes in the galaxy. {time_increment} elapses with significant changes across multiple systems."
         }
     
+    def _increment_days(self, time_increment: str) -> int:
+        """Parse an increment like "1 day" or "2 weeks" into days"""
+        count, _, unit = time_increment.strip().partition(" ")
+        unit_days = TIME_UNIT_DAYS.get(unit.strip().lower().rstrip("s"))
+        if not count.isdigit() or unit_days is None:
+            raise ValueError(f"Unrecognized time increment: {time_increment}")
+        return int(count) * unit_days
+    
+    def _process_background_faction_activity(self, session_id: str, faction: str, days: int) -> Dict:
+        """Resolve one faction's off-screen activity over the elapsed days"""
+        territories = self.active_sessions[session_id].faction_control_map.setdefault(faction, [])
+        activity = random.choice(BACKGROUND_FACTION_ACTIVITIES)
+        
+        # Longer stretches give a faction more room to move, capped at a season's worth
+        territory_change = 0
+        if activity == "expansion" and random.random() < min(1.0, days / 90):
+            territories.append(f"Influenced System {len(territories)}")
+            territory_change = 1
+        elif activity == "retreat" and territories and random.random() < min(1.0, days / 90):
+            territories.pop()
+            territory_change = -1
+        
+        return {
+            "activity": activity,
+            "territory_change": territory_change,
+            "controlled_systems": len(territories)
+        }
+    
+    def _generate_time_passage_events(self, session_id: str, days: int) -> List[Dict]:
+        """Drift each active conflict's intensity and report the ones that escalate or cool"""
+        events = []
+        drift = min(0.3, days * 0.01)
+        for conflict in self.active_sessions[session_id].active_conflicts:
+            change = random.uniform(-drift, drift)
+            conflict["intensity"] = max(0.0, min(1.0, conflict["intensity"] + change))
+            if abs(change) >= drift / 2:
+                events.append({
+                    "type": "conflict_escalation" if change > 0 else "conflict_deescalation",
+                    "conflict": conflict["name"],
+                    "intensity": round(conflict["intensity"], 2)
+                })
+        return events
+    
+    def _advance_galaxy_timestamp(self, galaxy_timestamp: str, days: int) -> str:
+        """Move the session's calendar forward, tracked as a day count after the era"""
+        era, _, elapsed = galaxy_timestamp.partition(", Day ")
+        return f"{era}, Day {int(elapsed or 0) + days}"
+    
+    def _update_session_timestamp(self, session_id: str):
+        """Mark the session's world state as changed so the next snapshot is rebuilt"""
+        self.active_sessions[session_id].last_updated = datetime.utcnow().isoformat()
+    
+    def _recent_events(self, session_id: str, count: int) -> List[Dict]:
+        """Most recent events for a session, oldest first"""
+        # Walk in from the right end so the cost is count, not the length of the log
+        recent = list(islice(reversed(self.session_events[session_id]), count))
+        recent.reverse()
+        return recent
+    
+    def _state_snapshot(self, session_state: SessionWorldState) -> Dict:
+        """asdict() of the world state, rebuilt only when last_updated has moved; treat as read-only"""
+        cached = self._state_snapshots.get(session_state.session_id)
+        if cached and cached[0] == session_state.last_updated:
+            return cached[1]
+        
+        snapshot = asdict(session_state)
+        self._state_snapshots[session_state.session_id] = (session_state.last_updated, snapshot)
+        return snapshot
+    
     def _generate_galaxy_timestamp(self) -> str:
         """Generate appropriate Star Wars timeline timestamp"""
-        eras = [
-            "25 ABY - New Jedi Order Era",
-            "4 ABY - New Republic Era", 
-            "0 BBY - Rebellion Era",
-            "19 BBY - Dark Times",
-            "22 BBY - Clone Wars"
-        ]
-        return f"Galactic Standard Calendar: {random.choice(eras)}"
+        return random.choice(GALAXY_ERAS)
     
     def _generate_initial_conflicts(self) -> List[Dict]:
         """Generate initial galactic conflicts for session"""
@@ -245,13 +358,7 @@ class MultplayerSessionManager:
     
     def _generate_faction_territories(self) -> Dict[str, List[str]]:
         """Generate initial faction territorial control"""
-        territories = {
-            "Empire": ["Coruscant", "Kuat", "Fondor", "Carida"],
-            "Rebellion": ["Mon Cala", "Chandrila", "Ryloth", "Onderon"], 
-            "Corporate": ["Sullust", "Sluis Van", "Bothawui", "Malastare"],
-            "Neutral": ["Tatooine", "Dagobah", "Hoth", "Kashyyyk"]
-        }
-        return territories
+        return {faction: list(systems) for faction, systems in INITIAL_FACTION_TERRITORIES.items()}
     
     def _execute_player_action(self, session_id: str, player_id: str, action: Dict) -> Dict:
         """Execute individual player action within session context"""
@@ -288,26 +395,26 @@ class MultplayerSessionManager:
         ripples = []
         
         # Get other players in session
-        session_players = [pid for pid, sid in self.player_sessions.items() if sid == session_id and pid != acting_player]
+        session_players = [pid for pid in self.session_players.get(session_id, ()) if pid != acting_player]
         
-        # Generate ripple effects for significant actions
+        # Generate ripple effects for significant actions; the description is shared by every player
         if result.get("faction_impact"):
-            for player in session_players:
-                ripples.append({
-                    "affected_player": player,
-                    "effect_type": "faction_reputation_shift",
-                    "magnitude": random.randint(1, 5),
-                    "description": f"Political ripples from {acting_player}'s actions affect the galaxy"
-                })
+            description = f"Political ripples from {acting_player}'s actions affect the galaxy"
+            ripples.extend({
+                "affected_player": player,
+                "effect_type": "faction_reputation_shift",
+                "magnitude": random.randint(1, 5),
+                "description": description
+            } for player in session_players)
         
         if result.get("force_impact"):
-            for player in session_players:
-                ripples.append({
-                    "affected_player": player,
-                    "effect_type": "force_disturbance",
-                    "magnitude": random.randint(1, 10),
-                    "description": f"Force disturbance felt across the galaxy from {acting_player}'s actions"
-                })
+            description = f"Force disturbance felt across the galaxy from {acting_player}'s actions"
+            ripples.extend({
+                "affected_player": player,
+                "effect_type": "force_disturbance",
+                "magnitude": random.randint(1, 10),
+                "description": description
+            } for player in session_players)
         
         return ripples
     
@@ -322,16 +429,18 @@ class MultplayerSessionManager:
                 if impact > 10:  # Significant positive impact
                     session_state.faction_control_map.setdefault(faction, []).append(f"Influenced System {len(session_state.faction_control_map.get(faction, []))}")
         
+        now = datetime.utcnow().isoformat()
+        
         # Add significant actions to global events
-        if result.get("experience_gained", 0) > 40:  # Major action
+        if result.get("experience_gained", 0) > MAJOR_ACTION_EXPERIENCE:
             session_state.global_events.append({
                 "type": "significant_player_action",
                 "action": action.get("type", "unknown"),
                 "impact_level": "major",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": now
             })
         
-        session_state.last_updated = datetime.utcnow().isoformat()
+        session_state.last_updated = now
     
     def _generate_action_narrative(self, session_id: str, player_id: str, action: Dict, result: Dict) -> str:
         """Generate AI-powered narrative for player actions"""
@@ -343,12 +452,14 @@ class MultplayerSessionManager:
             "nvidia/nemotron-mini-4b-instruct"
         )
         
-        default_narrative = f"The galaxy shifts subtly as {player_id}'s actions ripple through the Force and galactic politics."
-        
         if ai_response and ai_response.get("choices"):
             return ai_response["choices"][0]["message"]["content"]
         
-        return default_narrative
+        return self._default_action_narrative(player_id)
+    
+    def _default_action_narrative(self, player_id: str) -> str:
+        """Narrative used for minor actions and when the AI is unavailable"""
+        return f"The galaxy shifts subtly as {player_id}'s actions ripple through the Force and galactic politics."
     
     def _calculate_session_faction_balance(self, session_id: str) -> Dict[str, float]:
         """Calculate current faction power balance in session"""
@@ -356,24 +467,27 @@ class MultplayerSessionManager:
         
         balance = {"Empire": 0.33, "Rebellion": 0.33, "Corporate": 0.33}
         
-        # Calculate based on territorial control
+        # Calculate based on territorial control; the total is shared by every faction
+        total_territories = sum(len(t) for t in session_state.faction_control_map.values())
         for faction, territories in session_state.faction_control_map.items():
             if faction != "Neutral":
-                balance[faction] = len(territories) / sum(len(t) for t in session_state.faction_control_map.values() if t)
+                balance[faction] = len(territories) / total_territories
         
         return balance
     
     def _generate_session_summary(self, session_id: str) -> str:
         """Generate AI-powered session summary"""
         session_state = self.active_sessions[session_id]
-        recent_events = self.session_events[session_id][-5:]
+        recent_events = self._recent_events(session_id, 5)
         
         summary_context = f"Session in {session_state.galaxy_timestamp} with recent events: {[e.get('type', 'unknown') for e in recent_events]}"
         
-        ai_response = query_nemotron_api(
+        # Every player's sync asks for the same summary until new events arrive, so share it
+        ai_response = cached_nemotron(
             "You are a Star Wars chronicler. Summarize the current state of a galactic campaign session.",
             f"Provide a brief session summary for: {summary_context}",
-            "nvidia/nemotron-mini-4b-instruct"
+            "nvidia/nemotron-mini-4b-instruct",
+            ttl=SESSION_SUMMARY_TTL
         )
         
         default_summary = f"The galaxy remains in flux during {session_state.galaxy_timestamp}, with multiple factions vying for control and the Force guiding destiny."
@@ -382,6 +496,19 @@ class MultplayerSessionManager:
             return ai_response["choices"][0]["message"]["content"]
         
         return default_summary
+    
+    def _calculate_global_influence(self, session_id: str) -> Dict:
+        """Summarize this session's standing in the cross-session galaxy state"""
+        session_major_events = [
+            event for event in self.global_galaxy_state["major_events"]
+            if event.get("session_id") == session_id
+        ]
+        
+        return {
+            "faction_power_balance": self.global_galaxy_state["faction_power_balance"],
+            "galactic_threat_level": self.global_galaxy_state["galactic_threat_level"],
+            "session_major_events": len(session_major_events)
+        }
 
 # Import required modules for complete functionality
 import random
@@ -0,0 +1,42 @@
+"""
+Session Membership
+Single-statement join and leave against the session_users table
+"""
+from datetime import datetime
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from models import SessionState, SessionUser
+
+
+def _touch(session: SessionState):
+    db.session.execute(
+        update(SessionState).where(SessionState.id == session.id).values(last_active=datetime.utcnow())
+    )
+
+
+def add_user(session: SessionState, user: str) -> bool:
+    """Add user to a loaded session; False if they were already a member. Caller commits."""
+    insert = pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    added = db.session.execute(
+        insert(SessionUser).values(session_id=session.session_id, user=user, joined_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=['session_id', 'user'])
+    ).rowcount > 0
+    if added:
+        _touch(session)
+        # members is raise_on_sql, so reload it here rather than leaving it expired
+        db.session.refresh(session, ['members', 'last_active'])
+    return added
+
+
+def remove_user(session: SessionState, user: str) -> bool:
+    """Remove user from a loaded session; False if they were not a member. Caller commits."""
+    removed = db.session.execute(
+        delete(SessionUser).where(SessionUser.session_id == session.session_id, SessionUser.user == user)
+    ).rowcount > 0
+    if removed:
+        _touch(session)
+        # members is raise_on_sql, so reload it here rather than leaving it expired
+        db.session.refresh(session, ['members', 'last_active'])
+    return removed
@@ -0,0 +1,62 @@
+"""
+Background Task Queue
+In-process worker pool for slow AI work, with job state kept in the database so any instance can answer a poll
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from flask import current_app
+from sqlalchemy import delete, insert, update
+from app import db
+from models import BackgroundJob
+
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', '4'))
+JOB_TTL = int(os.environ.get('TASK_JOB_TTL', '600'))
+
+_executor = ThreadPoolExecutor(max_workers=TASK_WORKERS, thread_name_prefix='task-worker')
+
+
+def _finish(job_id: str, state: str, result: Any = None):
+    db.session.execute(
+        update(BackgroundJob).where(BackgroundJob.id == job_id).values(state=state, result=result)
+    )
+    db.session.commit()
+
+
+def _run(app, job_id: str, fn: Callable, args, kwargs):
+    with app.app_context():
+        try:
+            _finish(job_id, 'done', fn(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            logging.exception("Background job %s failed", job_id)
+            try:
+                _finish(job_id, 'failed')
+            except Exception:
+                db.session.rollback()
+                logging.exception("Could not record failure of background job %s", job_id)
+        finally:
+            db.session.remove()
+
+
+def submit(fn: Callable, *args, **kwargs) -> str:
+    """Run fn in the worker pool inside an app context; returns a job id for get()"""
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    # Own transaction, so the row is visible to pollers now and the caller's session is untouched
+    with db.engine.begin() as conn:
+        conn.execute(delete(BackgroundJob).where(BackgroundJob.created_at < now - timedelta(seconds=JOB_TTL)))
+        conn.execute(insert(BackgroundJob).values(id=job_id, state='pending', created_at=now))
+    _executor.submit(_run, current_app._get_current_object(), job_id, fn, args, kwargs)
+    return job_id
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job state dict ('pending', 'done' with result, or 'failed'); None if unknown or expired"""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or job.created_at < datetime.utcnow() - timedelta(seconds=JOB_TTL):
+        return None
+    return {'state': job.state, 'result': job.result}
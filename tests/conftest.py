@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+import pytest
+
+# app binds its database at import time, so point it at a throwaway SQLite file first
+_db_dir = tempfile.mkdtemp(prefix='galaxy-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.pop('NVIDIA_API_KEY', None)
+os.environ.pop('REDIS_URL', None)
+
+from app import app  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def client():
+    app.config['TESTING'] = True
+    return app.test_client()
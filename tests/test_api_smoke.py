@@ -0,0 +1,202 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app import app, db
+from models import CanvasEntry, NPCInteraction
+from services import npc_log_writer
+
+AUTH = {'Authorization': 'Bearer Abracadabra'}
+
+
+# Conditional GETs
+
+def test_openapi_spec_revalidates_with_304(client):
+    first = client.get('/openapi.yaml')
+    assert first.status_code == 200
+
+    again = client.get('/openapi.yaml', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_faction_state_poll_revalidates_with_304(client):
+    first = client.get('/get_faction_state?user=etag-user')
+    assert first.status_code == 200
+
+    again = client.get('/get_faction_state?user=etag-user', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+# Request body validation
+
+@pytest.mark.parametrize('body, content_type', [
+    (b'{bad', 'application/json'),
+    (b'[1, 2]', 'application/json'),
+    (b'', 'application/json'),
+    (b'{"user": "u"}', 'text/plain'),
+])
+def test_malformed_json_body_is_400(client, body, content_type):
+    response = client.post('/update_faction_reputation', data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_oversized_body_is_413(client):
+    body = b'{"pad": "' + b'x' * app.config['MAX_CONTENT_LENGTH'] + b'"}'
+    response = client.post('/save_canvas', data=body, content_type='application/json', headers=AUTH)
+    assert response.status_code == 413
+
+
+# Keyset pagination
+
+@pytest.fixture(scope='module')
+def canvas_page_rows():
+    """Ten entries for one user, seven of them sharing a timestamp across page boundaries"""
+    tied = datetime(2026, 1, 1, 12, 0, 0)
+    with app.app_context():
+        entries = [
+            CanvasEntry(canvas='hud', user='pager', data={'i': i}, meta={},
+                        timestamp=tied if i < 7 else datetime(2026, 1, 1, 11, 0, i))
+            for i in range(10)
+        ]
+        db.session.add_all(entries)
+        db.session.commit()
+        return {str(entry.id) for entry in entries}
+
+
+@pytest.mark.parametrize('path, key', [('/get_log', 'log'), ('/get_canvas_history', 'history')])
+@pytest.mark.parametrize('compact', ['', '1'])
+def test_cursor_pages_cover_every_row_once(client, canvas_page_rows, path, key, compact):
+    params = {'user': 'pager', 'limit': 3, 'compact': compact}
+    seen = []
+    while True:
+        page = client.get(path, query_string=params).get_json()
+        seen.extend(entry['id'] for entry in page[key])
+        if page['next_before_ts'] is None:
+            break
+        params.update(before_ts=page['next_before_ts'], before_id=page['next_before_id'])
+
+    assert len(seen) == len(canvas_page_rows)
+    assert set(seen) == canvas_page_rows
+
+
+def test_bad_cursor_is_400(client):
+    assert client.get('/get_log?before_ts=yesterday').status_code == 400
+    assert client.get('/get_log?before_ts=2026-01-01T12:00:00&before_id=nope').status_code == 400
+
+
+# Reputation upsert
+
+def _shift_reputation(client, user, reputation_change, awareness_change=0):
+    response = client.post('/update_faction_reputation', json={
+        'user': user,
+        'faction_name': 'Galactic Empire',
+        'reputation_change': reputation_change,
+        'awareness_change': awareness_change
+    })
+    assert response.status_code == 200
+    return response.get_json()['faction']
+
+
+def test_upsert_clamps_a_new_row(client):
+    faction = _shift_reputation(client, 'clamp-new', 500, -20)
+    assert (faction['reputation'], faction['awareness']) == (100, 0)
+
+
+def test_upsert_clamps_an_existing_row(client):
+    _shift_reputation(client, 'clamp-existing', -60, 90)
+    faction = _shift_reputation(client, 'clamp-existing', -60, 30)
+    assert (faction['reputation'], faction['awareness']) == (-100, 100)
+
+
+def test_upsert_unknown_faction_is_404(client):
+    response = client.post('/update_faction_reputation', json={'user': 'u', 'faction_name': 'Hutt Cartel'})
+    assert response.status_code == 404
+
+
+# Session membership
+
+def test_session_update_returns_members_in_read_order(client):
+    client.post('/create_session', json={'session_id': 'order-s', 'users': ['m']})
+    updated = client.post('/update_session_state', json={'session_id': 'order-s', 'users': ['x', 'm', 'b']})
+    fetched = client.get('/get_session_state?session_id=order-s')
+    assert updated.get_json()['session']['users'] == fetched.get_json()['session']['users'] == ['m', 'b', 'x']
+
+
+def test_join_and_leave_session(client):
+    client.post('/create_session', json={'session_id': 'join-s', 'users': ['han']})
+
+    joined = client.post('/join_session', json={'session_id': 'join-s', 'user': 'leia'}).get_json()
+    assert joined['session']['users'] == ['han', 'leia']
+    rejoined = client.post('/join_session', json={'session_id': 'join-s', 'user': 'leia'}).get_json()
+    assert rejoined['session']['users'] == ['han', 'leia']
+
+    left = client.post('/leave_session', json={'session_id': 'join-s', 'user': 'han'}).get_json()
+    assert left['session']['users'] == ['leia']
+    fetched = client.get('/get_session_state?session_id=join-s').get_json()
+    assert fetched['session']['users'] == ['leia']
+
+
+def test_join_unknown_session_is_404(client):
+    assert client.post('/join_session', json={'session_id': 'no-such-s', 'user': 'u'}).status_code == 404
+
+
+# Quests
+
+def test_bulk_quests_come_back_in_request_order(client):
+    users = ['bulk-c', 'bulk-a', 'bulk-b', 'bulk-a']
+    response = client.post('/generate_quests_bulk', json={'requests': [{'user': user} for user in users]})
+    assert response.status_code == 200
+    quests = response.get_json()['quests']
+    assert [quest['user'] for quest in quests] == users
+    assert len({quest['id'] for quest in quests}) == len(users)
+
+
+# Background jobs
+
+def _poll(client, path, attempts=50):
+    for _ in range(attempts):
+        response = client.get(path)
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    raise AssertionError(f"{path} still pending")
+
+
+def test_async_faction_turn_is_polled_to_completion(client):
+    queued = client.post('/faction_ai_turn', json={'faction': 'Galactic Empire', 'async': True})
+    assert queued.status_code == 202
+
+    done = _poll(client, f"/faction_turn_status/{queued.get_json()['job_id']}")
+    assert done.status_code == 200
+    assert done.get_json()['updated_state']['faction_name'] == 'Galactic Empire'
+
+
+def test_unknown_job_is_404(client):
+    assert client.get('/faction_turn_status/0123456789abcdef').status_code == 404
+
+
+# Streaming
+
+def test_npc_stream_is_logged_once_finished(client):
+    response = client.post('/query_nemotron_stream', json={
+        'message': 'Any work for a pilot?', 'npc_name': 'Dex', 'npc_type': 'merchant', 'user': 'streamer'
+    })
+    assert response.mimetype == 'text/plain'
+    reply = response.get_data(as_text=True)
+    assert reply
+
+    # Stops the writer after it drains the queue; the next interaction starts a new one
+    npc_log_writer.flush()
+    with app.app_context():
+        logged = NPCInteraction.query.filter_by(user='streamer', npc_name='Dex').one()
+    assert logged.npc_response == reply
+
+    history = client.get('/get_npc_history?user=streamer&npc_name=Dex').get_json()
+    assert [entry['npc_response'] for entry in history['history']] == [reply]
+
+
+def test_streamed_list_of_nothing_is_valid_json(client):
+    assert client.get('/get_npc_history?user=nobody&npc_name=Dex').get_json() == {'status': 'success', 'history': []}
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app import app, db
+from models import NPCInteraction, PlayerCharacter
+from services import cache_service, character_cache, npc_log_writer, nvidia_service, task_queue
+from utils import fastjson
+
+
+# Player character cache
+
+def test_character_reads_bypass_a_per_worker_cache():
+    assert not cache_service.is_shared()
+    with app.app_context():
+        db.session.add(PlayerCharacter(user='cache-pc', name='Kira', force_alignment='Light'))
+        db.session.commit()
+        assert character_cache.get_character('cache-pc')['force_alignment'] == 'Light'
+
+        # Another worker's write only invalidates its own in-process cache
+        PlayerCharacter.query.filter_by(user='cache-pc').update({'force_alignment': 'Dark'})
+        db.session.commit()
+        assert character_cache.get_character('cache-pc')['force_alignment'] == 'Dark'
+
+
+# NPC interaction log writer
+
+def _npc_row(npc_name):
+    return {'user': 'npc-writer', 'npc_name': npc_name, 'npc_response': 'Hello there', 'timestamp': datetime.utcnow()}
+
+
+def test_failed_npc_batch_drops_only_the_bad_row():
+    npc_log_writer._write_batch(app, [_npc_row('Ahsoka'), _npc_row(None), _npc_row('Rex')])
+    with app.app_context():
+        names = {row.npc_name for row in NPCInteraction.query.filter_by(user='npc-writer')}
+    assert names == {'Ahsoka', 'Rex'}
+
+
+# Fast JSON helpers
+
+def test_fastjson_dumps_honours_indent_and_sort_keys():
+    value = {'b': 1, 'a': [1, 2]}
+    assert fastjson.dumps(value, indent=2, sort_keys=True) == json.dumps(value, indent=2, sort_keys=True)
+
+
+def test_fastjson_dumps_rejects_unsupported_options():
+    with pytest.raises(TypeError):
+        fastjson.dumps({}, default=str)
+
+
+# Nemotron prompt cache
+
+def test_concurrent_identical_prompts_share_one_call(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow_api(system_message, user_message, model=None):
+        calls.append(user_message)
+        release.wait(5)
+        return {'id': 'single-flight', 'choices': []}
+
+    monkeypatch.setattr(nvidia_service, 'query_nemotron_api', slow_api)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(nvidia_service.cached_nemotron('npc', 'Single flight?')))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    # Let the followers find the leader's in-flight call before it returns
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{'id': 'single-flight', 'choices': []}] * 5
+    assert nvidia_service.cached_nemotron('npc', 'single flight') == results[0]
+    assert len(calls) == 1
+
+
+class _FakeStream:
+    def __init__(self, tokens):
+        self.lines = [b'data: ' + json.dumps({'choices': [{'delta': {'content': t}}]}).encode() for t in tokens]
+        self.lines.append(b'data: [DONE]')
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_stream_sends_the_first_token_alone_then_coalesces(monkeypatch):
+    tokens = [f't{i} ' for i in range(12)]
+    monkeypatch.setattr(nvidia_service, 'query_nemotron_streaming', lambda *args, **kwargs: _FakeStream(tokens))
+    chunks = list(nvidia_service.stream_nemotron_tokens('npc', 'hello'))
+    size = nvidia_service.STREAM_FLUSH_TOKENS
+    assert chunks == [tokens[0], ''.join(tokens[1:1 + size]), ''.join(tokens[1 + size:])]
+
+
+# Background task queue
+
+def _explode():
+    raise RuntimeError('turn failed')
+
+
+def test_failed_background_job_is_reported():
+    with app.test_request_context():
+        job_id = task_queue.submit(_explode)
+        for _ in range(50):
+            job = task_queue.get(job_id)
+            if job['state'] != 'pending':
+                break
+            time.sleep(0.05)
+            db.session.expire_all()
+    assert job == {'state': 'failed', 'result': None}
@@ -0,0 +1,73 @@
+"""
+Fast JSON Helpers
+orjson-backed drop-in replacements for the stdlib json calls used by models and routes
+"""
+import dataclasses
+import json as stdlib_json
+import uuid
+from datetime import datetime
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    # Naive datetimes are UTC throughout the app and render as ISO 8601 with a Z suffix
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+    def dumps_bytes(obj, *, indent=None, sort_keys=False):
+        """Serialize straight to UTF-8 bytes for response bodies"""
+        option = OPTIONS
+        if indent is not None:
+            if indent != 2:
+                raise ValueError("orjson only indents by 2 spaces")
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option, default=str)
+
+    loads = orjson.loads
+else:
+    def _default(obj):
+        """Match orjson's handling of the non-JSON types the app produces"""
+        if isinstance(obj, datetime):
+            return obj.isoformat() + 'Z' if obj.tzinfo is None else obj.isoformat()
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        if dataclasses.is_dataclass(obj):
+            return dataclasses.asdict(obj)
+        return str(obj)
+
+    def dumps_bytes(obj, *, indent=None, sort_keys=False):
+        """Serialize straight to UTF-8 bytes for response bodies"""
+        separators = (',', ':') if indent is None else (',', ': ')
+        return stdlib_json.dumps(
+            obj, indent=indent, sort_keys=sort_keys, separators=separators, ensure_ascii=False, default=_default
+        ).encode('utf-8')
+
+    loads = stdlib_json.loads
+
+
+def dumps(obj, *, indent=None, sort_keys=False):
+    """Serialize to a JSON string; other json.dumps options are not supported and raise TypeError"""
+    return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode('utf-8')
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider that hands orjson bytes straight to the response"""
+
+    def dumps(self, obj, **kwargs):
+        # Flask's session serializer asks for compact separators, which is already the output
+        if kwargs.get('separators') == (',', ':'):
+            del kwargs['separators']
+        return dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')
@@ -0,0 +1,95 @@
+"""
+HTTP Helpers
+Response builders shared by the app and route blueprints
+"""
+import hashlib
+from datetime import datetime, timezone
+from flask import abort, request, Response, stream_with_context
+from utils.fastjson import dumps_bytes, loads
+
+
+def fast_json_body() -> dict:
+    """Parse a JSON object request body with orjson; aborts with 400 if it is missing, malformed or not an object"""
+    if not request.is_json:
+        abort(400, description='Request body must be JSON')
+    
+    raw = request.get_data(cache=False)
+    try:
+        data = loads(raw) if raw else None
+    except ValueError:
+        abort(400, description='Malformed JSON body')
+    
+    if not isinstance(data, dict):
+        abort(400, description='Request body must be a JSON object')
+    return data
+
+
+def jresp(payload, status: int = 200) -> Response:
+    """JSON response built directly from orjson bytes"""
+    return Response(dumps_bytes(payload), status=status, mimetype='application/json')
+
+
+def stream_json_list(key: str, items, head: dict = None, tail=None) -> Response:
+    """Stream {**head, key: [items...], **tail()} one serialized item at a time
+
+    tail is called after items is exhausted, so it can report values gathered while streaming.
+    """
+    def generate():
+        opening = dumps_bytes(head or {})[:-1]
+        yield opening + (b',' if len(opening) > 1 else b'') + dumps_bytes(key) + b':['
+        
+        separator = b''
+        for item in items:
+            yield separator + dumps_bytes(item)
+            separator = b','
+        
+        closing = dumps_bytes(tail() if tail else {})
+        yield b'],' + closing[1:] if len(closing) > 2 else b']}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def page_params(default_limit: int = 50, max_limit: int = 500):
+    """Read limit and the (before_ts, before_id) keyset cursor; ValueError on a bad before_ts
+
+    The cursor is None on the first page. before_id is returned as sent, or None for a
+    timestamp-only cursor, since only the caller knows its primary key type.
+    """
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    
+    before_ts = request.args.get('before_ts')
+    if not before_ts:
+        return limit, None
+    
+    before_ts = datetime.fromisoformat(before_ts)
+    if before_ts.tzinfo is not None:
+        before_ts = before_ts.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    return limit, (before_ts, request.args.get('before_id') or None)
+
+
+def make_etag(body: bytes) -> str:
+    """Short strong validator for a response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def conditional_response(body: bytes, mimetype: str, etag: str = None, max_age: int = None) -> Response:
+    """Return body, or a bodiless 304 when the client already holds the same ETag"""
+    etag = etag or make_etag(body)
+    headers = {'ETag': f'"{etag}"'}
+    if max_age is not None:
+        headers['Cache-Control'] = f'public, max-age={max_age}'
+    
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+def json_conditional_response(payload, status: int = 200) -> Response:
+    """Serialize payload once and short-circuit unchanged polls with 304"""
+    response = conditional_response(dumps_bytes(payload), 'application/json')
+    if response.status_code == 200:
+        response.status_code = status
+    return response